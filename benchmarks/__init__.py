@@ -0,0 +1,6 @@
+"""
+Benchmarks for report and collector stages on synthetic data.
+
+    python -m benchmarks.run --players 10 100 --matches 1000 10000
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/latest.json
+"""
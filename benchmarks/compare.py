@@ -0,0 +1,54 @@
+"""
+Compares two benchmark result files and exits with 1 if any stage got slower.
+
+    python -m benchmarks.compare baseline.json latest.json --tolerance 1.2
+"""
+import argparse
+import json
+import sys
+
+# Заміри, коротші за це, надто шумні, щоб на них падати
+MIN_SECONDS = 0.001
+
+
+def load(path: str) -> dict[tuple, float]:
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return {(r["stage"], r["players"], r["matches"]): r["best_s"] for r in report["results"]}
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    """Returns one line per stage that is slower than baseline * tolerance."""
+    regressions = []
+    for key in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[key], current[key]
+        if max(before, after) < MIN_SECONDS:
+            continue
+        ratio = after / before if before else float("inf")
+        stage, players, matches = key
+        line = (f"{stage:<26} {players:>5}p {matches:>8}m"
+                f"  {before * 1000:10.2f} -> {after * 1000:10.2f} ms  x{ratio:.2f}")
+        print(line)
+        if ratio > tolerance:
+            regressions.append(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=1.2,
+                        help="allowed slowdown factor of best time")
+    args = parser.parse_args()
+
+    regressions = compare(load(args.baseline), load(args.current), args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) over x{args.tolerance}:")
+        print("\n".join(regressions))
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
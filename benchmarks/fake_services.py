@@ -0,0 +1,405 @@
+"""
+Local stand-ins for OpenDota, STRATZ and Supabase (PostgREST) with injectable
+latency, errors and 429s, serving one seeded synthetic world.
+
+    python -m benchmarks.fake_services --players 100 --matches 20000 --latency 0.05 \\
+        --fault opendota:rate_limit=60 --fault opendota:rate_window=60 \\
+        --fault stratz:error_rate=0.05
+
+then point the bot at it with the printed OPENDOTA_BASE_URL / STRATZ_GRAPHQL_URL /
+SUPABASE_URL. Request counts per service and status are served at /__stats.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+from benchmarks.generator import generate_matches, generate_players, raw_match
+
+SERVICES = ("opendota", "stratz", "supabase")
+# Заголовок із залишком квоти — як у справжніх сервісів
+REMAINING_HEADERS = {
+    "opendota": "X-Rate-Limit-Remaining-Minute",
+    "stratz": "X-RateLimit-Remaining-Second",
+    "supabase": "X-RateLimit-Remaining",
+}
+TABLE_KEYS = {
+    "channels": ("id",),
+    "players": ("steam_id",),
+    "player_channels": ("steam_id", "channel_id"),
+    "matchlog": ("match_id",),
+    "match_players": ("match_id", "steam_id"),
+    "player_daily_rollup": ("steam_id", "day", "match_mode"),
+}
+# Службові параметри PostgREST, що не є фільтрами
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+ALIAS_RE = re.compile(r"(\w+)\s*:\s*match\(id:\s*(\d+)\)")
+FILLER_STEAM_ID = 900_000_000
+
+
+@dataclass
+class Faults:
+    latency: float = 0.0        # середня затримка відповіді, с
+    jitter: float = 0.0         # +- до затримки, с
+    error_rate: float = 0.0     # частка відповідей 500
+    rate_limit: float = 0.0     # запитів за rate_window, 0 = без ліміту
+    rate_window: float = 1.0
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, window: float):
+        self.capacity = capacity
+        self.refill = capacity / window
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> tuple[bool, float]:
+        """Returns (allowed, seconds until the next token)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.refill
+
+
+class FakeWorld:
+    """Seeded players and matches shared by all fake services."""
+
+    def __init__(self, n_players: int, n_matches: int, seed: int = 0):
+        self.players, self.channels = generate_players(n_players, seed)
+        self.matches = generate_matches(self.channels, n_matches, seed)
+        self.by_id = {m.match_id: m for m in self.matches}
+        self.by_player: dict[int, list] = {p.steam_id: [] for p in self.players}
+        for m in self.matches:  # matches уже від найновіших
+            for pid in m.player_ids:
+                self.by_player[pid].append(m)
+        self.parse_jobs = 0
+
+    def stratz_players(self, m) -> list[dict]:
+        # Соло = без partyId; несоло-одинак грав у паті з кимось не з наших
+        party_id = None if len(m.player_ids) == 1 and m.solo_status else m.match_id
+        players = [{"steamAccountId": pid, "partyId": party_id} for pid in m.player_ids]
+        for i in range(10 - len(players)):
+            players.append({"steamAccountId": FILLER_STEAM_ID + i, "partyId": None})
+        return players
+
+
+# --- спільне: затримки, помилки, 429, статистика ---
+
+def faults_middleware(service: str, faults: Faults, stats: Counter):
+    bucket = TokenBucket(faults.rate_limit, faults.rate_window) if faults.rate_limit else None
+
+    @web.middleware
+    async def middleware(request, handler):
+        headers = {}
+        if bucket is not None:
+            allowed, wait = bucket.take()
+            headers[REMAINING_HEADERS[service]] = str(int(bucket.tokens))
+            if not allowed:
+                stats[(service, 429)] += 1
+                headers["Retry-After"] = str(max(1, round(wait)))
+                return web.json_response({"error": "rate limit exceeded"}, status=429,
+                                         headers=headers)
+        if faults.latency or faults.jitter:
+            delay = faults.latency + random.uniform(-faults.jitter, faults.jitter)
+            await asyncio.sleep(max(0.0, delay))
+        if faults.error_rate and random.random() < faults.error_rate:
+            stats[(service, 500)] += 1
+            return web.json_response({"error": "injected failure"}, status=500, headers=headers)
+
+        response = await handler(request)
+        response.headers.update(headers)
+        stats[(service, response.status)] += 1
+        return response
+
+    return middleware
+
+
+# --- OpenDota ---
+
+def _json_with_etag(request: web.Request, payload) -> web.Response:
+    """JSON response with an ETag; 304 when If-None-Match still matches (as Express does)."""
+    body = json.dumps(payload)
+    etag = f'W/"{hashlib.sha1(body.encode()).hexdigest()[:16]}"'
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+    return web.Response(text=body, content_type="application/json", headers={"ETag": etag})
+
+
+def opendota_app(world: FakeWorld, faults: Faults, stats: Counter) -> web.Application:
+    async def player_matches(request):
+        steam_id = int(request.match_info["steam_id"])
+        matches = world.by_player.get(steam_id, [])
+        if "date" in request.query:
+            since = datetime.now(timezone.utc) - timedelta(days=float(request.query["date"]))
+            matches = [m for m in matches if m.endtime >= since]
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query["limit"]) if "limit" in request.query else None
+        matches = matches[offset:offset + limit if limit is not None else None]
+        rows = [raw_match(m) for m in matches]
+        project = request.query.getall("project", [])
+        if project:
+            rows = [{k: row[k] for k in project if k in row} for row in rows]
+        return _json_with_etag(request, rows)
+
+    async def player(request):
+        steam_id = int(request.match_info["steam_id"])
+        for p in world.players:
+            if p.steam_id == steam_id:
+                return _json_with_etag(request, {
+                    "profile": {"account_id": steam_id, "personaname": p.name["telegram"]},
+                    "rank_tier": p.current_rank,
+                })
+        return _json_with_etag(request, {"profile": None, "rank_tier": None})
+
+    async def request_parse(request):
+        world.parse_jobs += 1
+        return web.json_response({"job": {"jobId": world.parse_jobs}})
+
+    app = web.Application(middlewares=[faults_middleware("opendota", faults, stats)])
+    app.router.add_get("/players/{steam_id}/matches", player_matches)
+    app.router.add_get("/players/{steam_id}", player)
+    app.router.add_post("/request/{match_id}", request_parse)
+    return app
+
+
+# --- STRATZ ---
+
+def stratz_app(world: FakeWorld, faults: Faults, stats: Counter) -> web.Application:
+    async def graphql(request):
+        query = (await request.json()).get("query", "")
+        data = {}
+        for alias, match_id in ALIAS_RE.findall(query):
+            m = world.by_id.get(int(match_id))
+            data[alias] = {"players": world.stratz_players(m)} if m else None
+        return web.json_response({"data": data})
+
+    app = web.Application(middlewares=[faults_middleware("stratz", faults, stats)])
+    app.router.add_post("/graphql", graphql)
+    return app
+
+
+# --- Supabase / PostgREST ---
+
+def _coerce(sample, raw: str):
+    if isinstance(sample, bool):
+        return raw.lower() == "true"
+    if isinstance(sample, int):
+        return int(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _matches_filter(row: dict, column: str, expression: str) -> bool:
+    op, _, raw = expression.partition(".")
+    value = row.get(column)
+    if op == "is":
+        return value is None if raw == "null" else str(value).lower() == raw
+    if value is None:
+        return False
+    if op == "in":
+        options = [o.strip().strip('"') for o in raw.strip("()").split(",") if o.strip()]
+        return value in {_coerce(value, o) for o in options}
+    other = _coerce(value, raw)
+    return {
+        "eq": value == other, "neq": value != other,
+        "gt": value > other, "gte": value >= other,
+        "lt": value < other, "lte": value <= other,
+    }[op]
+
+
+class FakePostgrest:
+    """In-memory tables speaking the subset of PostgREST that SupabaseStorage uses."""
+
+    def __init__(self):
+        self.tables: dict[str, dict[tuple, dict]] = {name: {} for name in TABLE_KEYS}
+
+    def seed_world(self, world: FakeWorld, with_matches: bool = False):
+        now = datetime.now(timezone.utc).isoformat()
+        for channel_id in world.channels:
+            self.write("channels", [{"id": channel_id, "name": channel_id, "permissions": {},
+                                     "joined_at": now}], upsert=True)
+        self.write("players", [
+            {"steam_id": p.steam_id, "name": p.name, "current_rank": p.current_rank,
+             "channel_ids": p.channel_ids}
+            for p in world.players
+        ], upsert=True)
+        if with_matches:
+            self.write("matchlog", [
+                {"match_id": m.match_id, "player_ids": m.player_ids,
+                 "win_status": int(m.win_status), "solo_status": int(m.solo_status),
+                 "endtime": m.endtime.isoformat(), "duration": m.duration,
+                 "match_mode": m.match_mode}
+                for m in world.matches
+            ], upsert=True)
+            self.write("match_players", [
+                {"match_id": m.match_id, "steam_id": pid}
+                for m in world.matches for pid in m.player_ids
+            ], upsert=True)
+
+    def select(self, table: str, params) -> list[dict]:
+        filters = [(k, v) for k, v in params.items() if k not in RESERVED_PARAMS]
+        rows = [
+            row for row in self.tables[table].values()
+            if all(_matches_filter(row, col, expr) for col, expr in filters)
+        ]
+        if "order" in params:
+            # Стабільне сортування з кінця списку ключів = сортування за всіма ключами
+            for term in reversed(params["order"].split(",")):
+                column, _, direction = term.partition(".")
+                rows.sort(key=lambda r: (r.get(column) is None, r.get(column) or 0),
+                          reverse=direction.startswith("desc"))
+        offset = int(params.get("offset", 0))
+        limit = int(params["limit"]) if "limit" in params else None
+        return rows[offset:offset + limit if limit is not None else None]
+
+    def write(self, table: str, rows: list[dict], upsert: bool = False,
+              ignore_duplicates: bool = False, on_conflict: str | None = None) -> list[dict]:
+        key_columns = tuple(on_conflict.split(",")) if on_conflict else TABLE_KEYS[table]
+        stored = self.tables[table]
+        written = []
+        for row in rows:
+            key = tuple(row.get(c) for c in key_columns)
+            if key in stored:
+                if not upsert:
+                    raise web.HTTPConflict(
+                        text=json.dumps({"code": "23505", "message": "duplicate key"}),
+                        content_type="application/json")
+                if ignore_duplicates:
+                    continue
+                stored[key].update(row)
+            else:
+                stored[key] = dict(row)
+            written.append(stored[key])
+            if table == "players":
+                # Як тригер у Supabase: channel_ids -> player_channels
+                links = [{"steam_id": row["steam_id"], "channel_id": ch}
+                         for ch in row.get("channel_ids") or []]
+                self.write("player_channels", links, upsert=True, ignore_duplicates=True)
+        return written
+
+    def app(self, faults: Faults, stats: Counter) -> web.Application:
+        def project(rows, params):
+            select = params.get("select", "*")
+            if select == "*":
+                return rows
+            columns = select.split(",")
+            return [{c: row.get(c) for c in columns} for row in rows]
+
+        async def handle(request):
+            table = request.match_info["table"]
+            if table not in self.tables:
+                return web.json_response({"message": f"unknown table {table}"}, status=404)
+            params = request.query
+            prefer = request.headers.get("Prefer", "")
+
+            if request.method == "GET":
+                return web.json_response(project(self.select(table, params), params))
+
+            if request.method == "POST":
+                body = await request.json()
+                rows = self.write(
+                    table, body if isinstance(body, list) else [body],
+                    upsert="resolution=" in prefer,
+                    ignore_duplicates="resolution=ignore-duplicates" in prefer,
+                    on_conflict=params.get("on_conflict"),
+                )
+                return web.json_response(rows, status=201)
+
+            matched = self.select(table, {k: v for k, v in params.items()
+                                          if k not in ("order", "limit", "offset")})
+            if request.method == "PATCH":
+                updates = await request.json()
+                for row in matched:
+                    row.update(updates)
+                return web.json_response(matched)
+
+            key_columns = TABLE_KEYS[table]
+            for row in matched:
+                self.tables[table].pop(tuple(row.get(c) for c in key_columns), None)
+            return web.json_response(matched)
+
+        app = web.Application(middlewares=[faults_middleware("supabase", faults, stats)])
+        app.router.add_route("*", "/rest/v1/{table}", handle)
+        return app
+
+
+def build_app(world: FakeWorld, faults: dict[str, Faults] | None = None,
+              postgrest: FakePostgrest | None = None) -> web.Application:
+    """One server: /opendota/api, /stratz/graphql, /supabase/rest/v1, plus /__stats."""
+    faults = faults or {}
+    stats: Counter = Counter()
+    postgrest = postgrest or FakePostgrest()
+
+    async def stats_handler(request):
+        return web.json_response({f"{service} {status}": count
+                                  for (service, status), count in sorted(stats.items())})
+
+    app = web.Application()
+    app["stats"] = stats
+    app["postgrest"] = postgrest
+    app.router.add_get("/__stats", stats_handler)
+    app.add_subapp("/opendota/api", opendota_app(world, faults.get("opendota", Faults()), stats))
+    app.add_subapp("/stratz", stratz_app(world, faults.get("stratz", Faults()), stats))
+    app.add_subapp("/supabase", postgrest.app(faults.get("supabase", Faults()), stats))
+    return app
+
+
+def parse_faults(args) -> dict[str, Faults]:
+    base = {f.name: getattr(args, f.name) for f in fields(Faults)}
+    faults = {service: Faults(**base) for service in SERVICES}
+    for spec in args.fault:
+        service, _, assignment = spec.partition(":")
+        name, _, value = assignment.partition("=")
+        if service not in faults or name not in base:
+            raise SystemExit(f"bad --fault {spec!r}: expected SERVICE:FIELD=VALUE")
+        setattr(faults[service], name, float(value))
+    return faults
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--players", type=int, default=30)
+    parser.add_argument("--matches", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-matchlog", action="store_true",
+                        help="preload PostgREST matchlog with the world's matches")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", dest="error_rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", dest="rate_limit", type=float, default=0.0)
+    parser.add_argument("--rate-window", dest="rate_window", type=float, default=1.0)
+    parser.add_argument("--fault", action="append", default=[],
+                        help="per-service override, e.g. stratz:error_rate=0.2")
+    args = parser.parse_args()
+
+    world = FakeWorld(args.players, args.matches, args.seed)
+    postgrest = FakePostgrest()
+    postgrest.seed_world(world, with_matches=args.seed_matchlog)
+    app = build_app(world, parse_faults(args), postgrest)
+
+    base = f"http://{args.host}:{args.port}"
+    print("Point the bot at the fakes with:")
+    print(f"  OPENDOTA_BASE_URL={base}/opendota/api")
+    print(f"  STRATZ_GRAPHQL_URL={base}/stratz/graphql")
+    print(f"  SUPABASE_URL={base}/supabase")
+    print("  SUPABASE_KEY=fake.fake.fake STORAGE_BACKEND=supabase")
+    print(f"  channels: {', '.join(world.channels)}")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
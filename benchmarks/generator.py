@@ -0,0 +1,104 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from match_stats import Match
+from shift_master import Player
+
+# Розподіли зняті з matchlog.csv
+MODE_WEIGHTS = {22: 0.885, 4: 0.115}
+# Скільки наших гравців у матчі
+PARTY_SIZE_WEIGHTS = {1: 0.59, 2: 0.08, 3: 0.075, 4: 0.11, 5: 0.145}
+# Частка соло серед матчів з одним нашим гравцем (пати соло не бувають)
+SOLO_SHARE = 0.8
+WIN_RATE = 0.5
+DURATION_MEAN = 2550
+DURATION_STDEV = 620
+# Скільки ігор на день у середньому грає один гравець
+GAMES_PER_PLAYER_DAY = 0.8
+# Історія не довша за цей час, навіть якщо гравців мало, а матчів багато
+MAX_SPAN_DAYS = 3 * 365
+# Розмір чату: партії збираються всередині одного каналу
+CHANNEL_SIZE = 15
+
+FIRST_MATCH_ID = 8_000_000_000
+FIRST_STEAM_ID = 10_000_000
+
+
+def _weighted(rng: random.Random, weights: dict):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def generate_players(count: int, seed: int = 0) -> tuple[list[Player], dict[str, list[Player]]]:
+    """Players with telegram/discord names, split into channels of CHANNEL_SIZE."""
+    rng = random.Random(seed)
+    steam_ids = rng.sample(range(FIRST_STEAM_ID, FIRST_STEAM_ID + count * 100), count)
+    players = []
+    channels: dict[str, list[Player]] = {}
+    for i, steam_id in enumerate(steam_ids):
+        player = Player(steam_id, {"telegram": f"@tg_{steam_id}", "discord": f"@dc_{steam_id}"})
+        player.current_rank = rng.randint(10, 80)
+        channel_id = str(-4_700_000_000 - i // CHANNEL_SIZE)
+        player.channel_ids = [channel_id]
+        players.append(player)
+        channels.setdefault(channel_id, []).append(player)
+    return players, channels
+
+
+def span_days(players: int, matches: int) -> float:
+    avg_party = sum(size * w for size, w in PARTY_SIZE_WEIGHTS.items())
+    ideal = matches * avg_party / (players * GAMES_PER_PLAYER_DAY)
+    return min(max(ideal, 1.0), MAX_SPAN_DAYS)
+
+
+def generate_matches(channels: dict[str, list[Player]], count: int, seed: int = 0,
+                     now: datetime | None = None) -> list[Match]:
+    """
+    count matches ending between now - span and now, newest first (like matchlog).
+    Parties are drawn from one channel, so players of a chat share matches.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    rosters = list(channels.values())
+    total_players = sum(len(r) for r in rosters)
+    span = timedelta(days=span_days(total_players, count))
+    weights = [len(r) for r in rosters]
+
+    offsets = sorted(rng.random() for _ in range(count))
+    matches = []
+    for i, offset in enumerate(offsets):
+        roster = rng.choices(rosters, weights=weights)[0]
+        party = rng.sample(roster, min(_weighted(rng, PARTY_SIZE_WEIGHTS), len(roster)))
+        matches.append(Match(
+            match_id=FIRST_MATCH_ID + count - i,
+            player_ids=[p.steam_id for p in party],
+            win_status=rng.random() < WIN_RATE,
+            solo_status=len(party) == 1 and rng.random() < SOLO_SHARE,
+            endtime=now - span * offset,
+            duration=int(min(max(rng.gauss(DURATION_MEAN, DURATION_STDEV), 600), 6000)),
+            match_mode=_weighted(rng, MODE_WEIGHTS),
+        ))
+    return matches
+
+
+def raw_match(m: Match) -> dict:
+    """One entry of OpenDota /players/{id}/matches for a tracked player of m."""
+    radiant = m.match_id % 2 == 0
+    return {
+        "match_id": m.match_id,
+        "start_time": math.floor((m.endtime - timedelta(seconds=m.duration)).timestamp()),
+        "duration": m.duration,
+        "radiant_win": radiant == m.win_status,
+        "player_slot": 0 if radiant else 128,
+        "game_mode": m.match_mode,
+    }
+
+
+def raw_player_matches(players: list[Player], matches: list[Match]) -> list[list[dict]]:
+    """Per-player lists shaped like OpenDota /players/{id}/matches, in roster order."""
+    by_player = {p.steam_id: [] for p in players}
+    for m in matches:
+        raw = raw_match(m)
+        for pid in m.player_ids:
+            by_player[pid].append(raw)
+    return [by_player[p.steam_id] for p in players]
@@ -0,0 +1,207 @@
+"""
+Times report and collector stages on seeded synthetic data and writes JSON results.
+
+    python -m benchmarks.run                                   # full matrix
+    python -m benchmarks.run --players 10 100 --matches 1000 10000 --repeat 5
+    python -m benchmarks.run --storage-max-matches 0           # in-memory stages only
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.generator import generate_matches, generate_players, raw_player_matches
+
+PLAYER_COUNTS = [10, 100, 1000]
+MATCH_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+# Етапи зі сховищем пишуть усе в SQLite, тож на великих обсягах вони довгі
+STORAGE_MAX_MATCHES = 100_000
+PLATFORM = "telegram"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _time(fn, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def memory_stages(players, matches) -> dict:
+    """Stage name -> zero-arg callable; all inputs are already in memory."""
+    import db
+    from match_collector_instarun_db import is_match_changed, merge_raw_matches
+    from match_stats import (
+        PeriodTotals,
+        compute_daily_rollups,
+        format_all_time_report,
+        generate_weekly_summary,
+    )
+    from match_table import MatchRecord, MatchTable
+    from shift_master import get_last_hour_solo_losers
+
+    index = MatchTable.of(matches)
+    records = [MatchRecord.from_match(m) for m in matches]
+    rollups = compute_daily_rollups(matches)
+    longest = max(matches, key=lambda m: m.duration or 0)
+    raw_by_player = raw_player_matches(players, matches)
+    days = (datetime.now(timezone.utc) - matches[-1].endtime).days + 1
+    # Половина матчів "вже в БД", кожен десятий з них змінився
+    existing = {}
+    for i, m in enumerate(matches[::2]):
+        row = db.matchlog_row(m)
+        if i % 10 == 0:
+            row["win_status"] = int(not m.win_status)
+        existing[m.match_id] = row
+
+    def split_changed():
+        merged, _ = merge_raw_matches(players, raw_by_player, days)
+        for match_id, match in merged.items():
+            row = existing.get(match_id)
+            if row is not None:
+                is_match_changed(row, match)
+
+    def update_daily_stats():
+        for player in players:
+            player.update_daily_stats(index)
+
+    return {
+        "match_table_build": lambda: MatchTable(records),
+        "weekly_summary": lambda: generate_weekly_summary(index, players, PLATFORM),
+        "all_time_from_matches": lambda: format_all_time_report(
+            PeriodTotals.from_matches(matches), longest, players, PLATFORM),
+        "daily_rollups": lambda: compute_daily_rollups(matches),
+        "all_time_from_rollups": lambda: format_all_time_report(
+            PeriodTotals.from_rollups(rollups), longest, players, PLATFORM),
+        "last_hour_solo_losers": lambda: asyncio.run(
+            get_last_hour_solo_losers(index, players, PLATFORM)),
+        "update_daily_stats": update_daily_stats,
+        "collector_merge": lambda: merge_raw_matches(players, raw_by_player, days),
+        "collector_split_changed": split_changed,
+    }
+
+
+def storage_stages(players, channels, matches, workdir: str) -> dict:
+    """End-to-end stages against a fresh local SQLite backend."""
+    import db
+    import storage
+    from match_stats import generate_all_time_report, generate_weekly_report
+    from sqlite_storage import SQLiteStorage
+
+    channel_id = next(iter(channels))
+    counter = iter(range(1_000_000))
+
+    def fresh_backend():
+        backend = SQLiteStorage(os.path.join(workdir, f"bench_{next(counter)}.sqlite3"))
+        storage.set_backend(backend)
+        db.invalidate_rosters()
+        backend.upsert_players([
+            {"steam_id": p.steam_id, "name": p.name, "current_rank": p.current_rank,
+             "channel_ids": p.channel_ids}
+            for p in players
+        ])
+        return backend
+
+    def write_matches():
+        asyncio.run(db.add_matches(matches))
+
+    # Звіти читають те, що записав останній прогін write_matches
+    return {
+        "storage_add_matches": (fresh_backend, write_matches),
+        "weekly_report": (None, lambda: asyncio.run(generate_weekly_report(channel_id, PLATFORM))),
+        "all_time_report": (
+            None, lambda: asyncio.run(generate_all_time_report(channel_id, PLATFORM))),
+    }
+
+
+def run_case(n_players: int, n_matches: int, repeat: int, seed: int,
+             storage_max: int, workdir: str) -> list[dict]:
+    players, channels = generate_players(n_players, seed)
+    matches = generate_matches(channels, n_matches, seed)
+    results = []
+
+    def record(stage, timings):
+        results.append({
+            "stage": stage,
+            "players": n_players,
+            "matches": n_matches,
+            "repeat": len(timings),
+            "best_s": min(timings),
+            "median_s": statistics.median(timings),
+        })
+        print(f"  {stage:<26} best {min(timings) * 1000:10.2f} ms"
+              f"  median {statistics.median(timings) * 1000:10.2f} ms")
+
+    for stage, fn in memory_stages(players, matches).items():
+        record(stage, _time(fn, repeat))
+
+    if n_matches <= storage_max:
+        for stage, (setup, fn) in storage_stages(players, channels, matches, workdir).items():
+            timings = []
+            for _ in range(repeat):
+                if setup:
+                    setup()
+                timings.extend(_time(fn, 1))
+            record(stage, timings)
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--players", type=int, nargs="+", default=PLAYER_COUNTS)
+    parser.add_argument("--matches", type=int, nargs="+", default=MATCH_COUNTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--storage-max-matches", type=int, default=STORAGE_MAX_MATCHES,
+                        help="skip SQLite stages above this many matches (0 = never run them)")
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "latest.json"))
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_players in args.players:
+            for n_matches in args.matches:
+                print(f"▶ {n_players} players, {n_matches} matches")
+                results.extend(run_case(n_players, n_matches, args.repeat, args.seed,
+                                        args.storage_max_matches, workdir))
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ {len(results)} results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Streams matchlog.csv / players.csv (legacy format) into the storage backend
+and exports the database back to the same format.
+
+    python csv_transfer.py import --matchlog matchlog.csv --players players.csv
+    python csv_transfer.py import --matchlog history.csv.zst --restart
+    python csv_transfer.py export --matchlog backup/matchlog.csv.zst --players backup/players.csv
+
+Files ending in .zst are read/written with zstd. Import upserts in chunks and
+records progress in the local state DB, so an interrupted run continues from
+the last committed chunk (unless --restart). After a matchlog import the
+rollups for the imported days are rebuilt.
+"""
+import argparse
+import ast
+import asyncio
+import csv
+import io
+import itertools
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+
+import local_store
+from match_collector_instarun_db import parse_player_ids
+from storage import get_backend
+
+MATCHLOG_COLUMNS = [
+    "match_id", "player_ids", "win_status", "solo_status", "endtime", "duration", "match_mode",
+]
+PLAYERS_COLUMNS = ["steam_id", "name", "current_rank", "channel_ids"]
+
+# Рядків на один upsert
+CHUNK_SIZE = 1000
+# Не частіше, ніж раз на стільки секунд друкуємо прогрес
+PROGRESS_INTERVAL = 2.0
+
+_table_ready = False
+
+
+def _db():
+    global _table_ready
+    conn = local_store.get_connection()
+    if not _table_ready:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS import_checkpoints ("
+            " path TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " file_size INTEGER NOT NULL,"
+            " rows_done INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (path, kind))"
+        )
+        _table_ready = True
+    return conn
+
+
+def get_checkpoint(path: str, kind: str) -> int:
+    """Rows already imported from this file, 0 if it changed since the last run."""
+    row = _db().execute(
+        "SELECT file_size, rows_done FROM import_checkpoints WHERE path = ? AND kind = ?",
+        (os.path.abspath(path), kind),
+    ).fetchone()
+    if row is None or row[0] != os.path.getsize(path):
+        return 0
+    return row[1]
+
+
+def save_checkpoint(path: str, kind: str, rows_done: int):
+    _db().execute(
+        "INSERT OR REPLACE INTO import_checkpoints VALUES (?, ?, ?, ?, ?)",
+        (os.path.abspath(path), kind, os.path.getsize(path), rows_done, time.time()),
+    )
+
+
+def _is_zstd(path: str) -> bool:
+    return path.endswith(".zst")
+
+
+@contextmanager
+def open_csv_reader(path: str):
+    """Yields (csv.DictReader, raw binary file); raw.tell() gives progress in file bytes."""
+    with open(path, "rb") as raw:
+        stream = raw
+        if _is_zstd(path):
+            import zstandard
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        with io.TextIOWrapper(stream, encoding="utf-8", newline="") as text:
+            yield csv.DictReader(text), raw
+
+
+@contextmanager
+def open_csv_writer(path: str, columns: list[str]):
+    """Writes to path + '.part' and renames on success, so a failed export leaves no half file."""
+    part = path + ".part"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(part, "wb") as raw:
+        stream = raw
+        if _is_zstd(path):
+            import zstandard
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(raw)
+        with io.TextIOWrapper(stream, encoding="utf-8", newline="") as text:
+            writer = csv.DictWriter(text, fieldnames=columns, lineterminator="\n")
+            writer.writeheader()
+            yield writer
+    os.replace(part, path)
+
+
+class Progress:
+    def __init__(self, label: str, total_bytes: int | None = None):
+        self.label = label
+        self.total_bytes = total_bytes
+        self.rows = 0
+        self.started = time.monotonic()
+        self._printed = 0.0
+        self._printed_rows = 0
+
+    def update(self, rows: int, position: int | None = None, final: bool = False):
+        self.rows += rows
+        now = time.monotonic()
+        if now - self._printed < PROGRESS_INTERVAL and not final:
+            return
+        if final and self.rows == self._printed_rows and self._printed:
+            return
+        self._printed = now
+        self._printed_rows = self.rows
+        elapsed = max(now - self.started, 1e-9)
+        percent = ""
+        if self.total_bytes and position is not None:
+            percent = f" {min(position / self.total_bytes, 1):.0%}"
+        print(f"[{self.label}]{percent} {self.rows} rows, {self.rows / elapsed:.0f} rows/s")
+
+
+# --- рядки CSV <-> рядки БД ---
+
+def _int_or_none(value):
+    return int(value) if value not in (None, "") else None
+
+
+def matchlog_row_from_csv(record: dict) -> dict:
+    return {
+        "match_id": int(record["match_id"]),
+        "player_ids": parse_player_ids(record["player_ids"]),
+        "win_status": _int_or_none(record["win_status"]),
+        "solo_status": _int_or_none(record["solo_status"]),
+        "endtime": record["endtime"] or None,
+        "duration": _int_or_none(record["duration"]),
+        "match_mode": _int_or_none(record["match_mode"]),
+    }
+
+
+def matchlog_row_to_csv(row: dict) -> dict:
+    player_ids = row.get("player_ids") or []
+    return {
+        "match_id": row["match_id"],
+        "player_ids": ";".join(str(pid) for pid in player_ids),
+        "win_status": "" if row.get("win_status") is None else int(row["win_status"]),
+        "solo_status": "" if row.get("solo_status") is None else int(row["solo_status"]),
+        "endtime": row.get("endtime") or "",
+        "duration": "" if row.get("duration") is None else row["duration"],
+        "match_mode": "" if row.get("match_mode") is None else row["match_mode"],
+    }
+
+
+def player_row_from_csv(record: dict) -> dict:
+    channel_ids = record.get("channel_ids") or "[]"
+    return {
+        "steam_id": int(record["steam_id"]),
+        "name": json.loads(record["name"]) if record.get("name") else {},
+        "current_rank": _int_or_none(record.get("current_rank")) or 0,
+        # Стара форма — python-список рядків: ['-4764440479']
+        "channel_ids": [str(ch) for ch in ast.literal_eval(channel_ids)],
+    }
+
+
+def player_row_to_csv(row: dict) -> dict:
+    name = row.get("name") or {}
+    return {
+        "steam_id": row["steam_id"],
+        "name": name if isinstance(name, str) else json.dumps(name),
+        "current_rank": row.get("current_rank") or 0,
+        "channel_ids": str([str(ch) for ch in row.get("channel_ids") or []]),
+    }
+
+
+# --- імпорт ---
+
+def _chunks(reader, chunk_size: int):
+    chunk = []
+    for record in reader:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _extend_days(days: tuple[date, date] | None, endtime: str | None):
+    if not endtime:
+        return days
+    day = datetime.fromisoformat(endtime).astimezone(timezone.utc).date()
+    return (min(days[0], day), max(days[1], day)) if days else (day, day)
+
+
+def import_matchlog(path: str, chunk_size: int = CHUNK_SIZE,
+                    restart: bool = False) -> tuple[date, date] | None:
+    """Returns the (first, last) UTC day touched, for the rollup rebuild."""
+    backend = get_backend()
+    done = 0 if restart else get_checkpoint(path, "matchlog")
+    if done:
+        print(f"[IMPORT] matchlog: resuming after {done} rows")
+    progress = Progress("IMPORT matchlog", os.path.getsize(path))
+    days = None
+
+    with open_csv_reader(path) as (reader, raw):
+        # Пропущені рядки теж рахуємо в дні: rollup-и минулого запуску могли не перерахуватись
+        for record in itertools.islice(reader, done):
+            days = _extend_days(days, record["endtime"])
+        for records in _chunks(reader, chunk_size):
+            rows = [matchlog_row_from_csv(r) for r in records]
+            links = [
+                {"match_id": row["match_id"], "steam_id": pid}
+                for row in rows
+                for pid in row["player_ids"]
+            ]
+            if not backend.upsert_matchlog(rows) or not backend.upsert_match_players(links):
+                raise RuntimeError(f"matchlog import failed after {done} rows")
+            done += len(rows)
+            save_checkpoint(path, "matchlog", done)
+
+            for row in rows:
+                days = _extend_days(days, row["endtime"])
+            progress.update(len(rows), raw.tell())
+        progress.update(0, raw.tell(), final=True)
+    return days
+
+
+def import_players(path: str, chunk_size: int = CHUNK_SIZE, restart: bool = False):
+    backend = get_backend()
+    done = 0 if restart else get_checkpoint(path, "players")
+    progress = Progress("IMPORT players", os.path.getsize(path))
+
+    with open_csv_reader(path) as (reader, raw):
+        for _ in itertools.islice(reader, done):
+            pass
+        for records in _chunks(reader, chunk_size):
+            if not backend.upsert_players([player_row_from_csv(r) for r in records]):
+                raise RuntimeError(f"players import failed after {done} rows")
+            done += len(records)
+            save_checkpoint(path, "players", done)
+            progress.update(len(records), raw.tell())
+        progress.update(0, raw.tell(), final=True)
+
+
+# --- експорт ---
+
+def export_matchlog(path: str, chunk_size: int = CHUNK_SIZE):
+    backend = get_backend()
+    progress = Progress("EXPORT matchlog")
+    last_id = None
+    with open_csv_writer(path, MATCHLOG_COLUMNS) as writer:
+        while True:
+            rows = backend.get_matchlog_page(last_id, chunk_size)
+            if not rows:
+                break
+            writer.writerows(matchlog_row_to_csv(row) for row in rows)
+            last_id = rows[-1]["match_id"]
+            progress.update(len(rows))
+    progress.update(0, final=True)
+
+
+def export_players(path: str):
+    rows = get_backend().get_players()
+    with open_csv_writer(path, PLAYERS_COLUMNS) as writer:
+        writer.writerows(player_row_to_csv(row) for row in rows)
+    print(f"[EXPORT players] {len(rows)} rows")
+
+
+async def run_import(args):
+    # Спершу гравці: тоді матчі одразу лягають на відомих гравців
+    if args.players:
+        import_players(args.players, args.chunk_size, args.restart)
+    if args.matchlog:
+        days = import_matchlog(args.matchlog, args.chunk_size, args.restart)
+        if days and not args.skip_rollups:
+            import rebuild_rollups
+            await rebuild_rollups.rebuild(*days)
+    print("✅ Import finished")
+
+
+def run_export(args):
+    if args.players:
+        export_players(args.players)
+    if args.matchlog:
+        export_matchlog(args.matchlog, args.chunk_size)
+    print("✅ Export finished")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("import", "export"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("--matchlog", help="matchlog CSV path (.zst for zstd)")
+        cmd.add_argument("--players", help="players CSV path (.zst for zstd)")
+        cmd.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    sub.choices["import"].add_argument("--restart", action="store_true",
+                                       help="ignore the saved checkpoint and start over")
+    sub.choices["import"].add_argument("--skip-rollups", action="store_true",
+                                       help="do not rebuild rollups for imported days")
+    args = parser.parse_args()
+    if not (args.matchlog or args.players):
+        parser.error("nothing to do: pass --matchlog and/or --players")
+
+    if args.command == "import":
+        asyncio.run(run_import(args))
+    else:
+        run_export(args)
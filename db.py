@@ -1,43 +1,72 @@
+import asyncio
+import copy
 import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
-from datetime import datetime, timezone
+import time
+from datetime import date, datetime, timedelta, timezone
+from datetime import time as dt_time
+from functools import partial
 from typing import List
+
+from dotenv import load_dotenv
+
+from logs import DEBUG, INFO, get_logger, kv, sampled, span
+from match_stats import Match, compute_daily_rollups
+from match_store import match_store
+from match_table import MatchRecord
+from metrics import cache_lookup
 from shift_master import Player
-from match_stats import Match
+from storage import get_backend
 
 load_dotenv()
 
-url: str = os.getenv("SUPABASE_URL")
-key: str = os.getenv("SUPABASE_KEY")
+log = get_logger("db")
+
+# Самі запити йдуть у сховище, обране через STORAGE_BACKEND (Supabase чи SQLite);
+# тут лишаються кеші, збірка Player/Match, match_store і rollup-и
+
+# Скільки запитів на запис пускаємо паралельно в масових операціях
+WRITE_CONCURRENCY = int(os.getenv("DB_WRITE_CONCURRENCY", "4"))
+
+# Поля matchlog, які порівнює колектор при пошуку змінених матчів
+MATCH_COMPARE_COLUMNS = (
+    "match_id, player_ids, win_status, solo_status, endtime, duration, match_mode"
+)
+
+# Кеш ростерів і каналів: команди ходять у сховище лише коли дані справді змінились.
+# Записи через цей модуль (add_player, remove_player, update_player, add_channel)
+# скидають кеш явно; ROSTER_CACHE_TTL — запобіжник для змін ззовні.
+ROSTER_CACHE_TTL = float(os.getenv("ROSTER_CACHE_TTL", "300"))
 
-supabase: Client = create_client(url, key)
+_roster_cache: dict[str, tuple[float, list]] = {}
+_channels_cache: tuple[float, list] | None = None
+
+def invalidate_rosters(channel_id=None):
+    if channel_id is None:
+        _roster_cache.clear()
+    else:
+        _roster_cache.pop(str(channel_id), None)
+
+def invalidate_channels():
+    global _channels_cache
+    _channels_cache = None
 
 def get_channels():
+    global _channels_cache
+    hit = _channels_cache is not None and time.monotonic() - _channels_cache[0] < ROSTER_CACHE_TTL
+    cache_lookup("channels", hit)
+    if hit:
+        return list(_channels_cache[1])
     try:
-        response = supabase.table("channels").select("id").execute()
-        if response.data is None:
-            print("Error fetching channels or no data returned")
-            return []
-        return [item["id"] for item in response.data]
+        channels = get_backend().get_channel_ids()
+        _channels_cache = (time.monotonic(), channels)
+        return list(channels)
     except Exception as e:
-        print("Exception in get_channels:", e)
+        log.error("get_channels failed: %r", e)
         return []
 
 def channel_exists(chat_id):
-    response = supabase.table("channels").select("id").execute()
-    print(f"DEBUG: response - {response.data}, chat_id - {chat_id}")
-    if response.data is None:
-        print("Error fetching channels or no data returned")
-        return False
-    for item in response.data:
-        # приводимо до одного типу для порівняння
-        if str(item["id"]) == str(chat_id):
-            print(f"DEBUG: equality is True")
-            return True
-        else:
-            print(f"DEBUG: equality is False")
-    return False
+    # приводимо до одного типу для порівняння
+    return str(chat_id) in {str(channel) for channel in get_channels()}
 
 async def add_channel(chat_id, chat_name, permissions=None):
     if permissions is None:
@@ -45,22 +74,19 @@ async def add_channel(chat_id, chat_name, permissions=None):
 
     now_utc = datetime.now(timezone.utc).isoformat()
 
-    response = supabase.table("channels").insert({
+    inserted = get_backend().insert_channel({
         "id": chat_id,
         "name": chat_name,
         "permissions": permissions,
         "joined_at": now_utc
-    }).execute()
+    })
 
-    if response.error or response.data is None:
-        print(f"Error inserting channel: {response.error}")
-        return False
-    return True
+    invalidate_channels()
+    return inserted
 
-def get_players():
-    response = supabase.table("players").select("*").execute()
+def _build_players(rows: list) -> list[Player]:
     players = []
-    for p in response.data:
+    for p in rows:
         # припустимо, що p['name'] збережено як json-рядок або dict
         name_dict = p.get("name")
         if isinstance(name_dict, str):
@@ -73,37 +99,30 @@ def get_players():
 
     return players
 
+def get_players():
+    return _build_players(get_backend().get_players())
+
 async def get_channel_players(channel_id: str) -> list[Player]:
+    cached = _roster_cache.get(str(channel_id))
+    hit = cached is not None and time.monotonic() - cached[0] < ROSTER_CACHE_TTL
+    cache_lookup("roster", hit)
+    if hit:
+        # Копії, бо звіти пишуть у Player денну статистику
+        return [copy.copy(p) for p in cached[1]]
+
+    players = await _load_channel_players(channel_id)
+    _roster_cache[str(channel_id)] = (time.monotonic(), players)
+    return [copy.copy(p) for p in players]
+
+async def _load_channel_players(channel_id: str) -> list[Player]:
+    backend = get_backend()
     # 1. Дістаємо steam_id з player_channels
-    res_ids = supabase.table("player_channels").select("steam_id").eq("channel_id", channel_id).execute()
-    if res_ids is None:
-        print("No data in Player_channels table")
-        return []
-
-    steam_ids = [item["steam_id"] for item in res_ids.data]
+    steam_ids = backend.get_channel_player_ids(channel_id)
     if not steam_ids:
         return []
 
-    # 2. Дістаємо повних гравців за steam_id
-    res_players = supabase.table("players").select("*").in_("steam_id", steam_ids).execute()
-    if res_players.data is None:
-        print("No data in Players table")
-        return []
-
-    # 3. Конвертуємо в список Player
-    players = []
-    for p in res_players.data:
-        # припустимо, що p['name'] збережено як json-рядок або dict
-        name_dict = p.get("name")
-        if isinstance(name_dict, str):
-            import json
-            name_dict = json.loads(name_dict)
-        player = Player(steam_id=p["steam_id"], name=name_dict)
-        player.current_rank = p.get("current_rank", 0)
-        # Додаткові поля якщо є
-        players.append(player)
-
-    return players
+    # 2. Дістаємо повних гравців за steam_id і конвертуємо в список Player
+    return _build_players(backend.get_players(steam_ids))
 
 # def add_player(player_data: dict):
 #     # Додаємо гравця в players
@@ -139,115 +158,123 @@ def add_player(pending_data: dict):
         "channel_ids": pending_data.get("channel_ids", [])
     }
 
-    res = supabase.table("players").insert(player_data).execute()
-
-    if not res.data:
-        print("Error inserting player:", res)
-        return False
-
-    return True
+    inserted = get_backend().insert_player(player_data)
+    invalidate_rosters()
+    return inserted
 
 def update_player(player_id, updates: dict):
-    supabase.table("players").update(updates).eq("steam_id", player_id).execute()
+    get_backend().update_players([player_id], updates)
+    invalidate_rosters()
+
+def update_player_ranks(ranks: dict):
+    """
+    Масово записує current_rank: один запит на кожне значення рангу,
+    а не на кожного гравця.
+    """
+    by_rank = {}
+    for steam_id, rank in ranks.items():
+        by_rank.setdefault(rank, []).append(steam_id)
+    for rank, steam_ids in by_rank.items():
+        get_backend().update_players(steam_ids, {"current_rank": rank})
+    if ranks:
+        invalidate_rosters()
 
 def remove_player(steam_id: int, channel_id: str = None):
     """
     Якщо channel_id заданий - тільки зняти зв'язок у player_channels,
     якщо ні - повністю видалити гравця і всі зв'язки.
     """
+    backend = get_backend()
     if channel_id:
         # Видаляємо зв'язок з конкретним каналом
-        supabase.table("player_channels") \
-            .delete() \
-            .eq("steam_id", steam_id) \
-            .eq("channel_id", channel_id) \
-            .execute()
+        backend.unlink_player(steam_id, channel_id)
 
         # Перевіряємо, чи залишились ще зв'язки для цього гравця
-        res = supabase.table("player_channels") \
-            .select("channel_id") \
-            .eq("steam_id", steam_id) \
-            .execute()
-        if not res.data:
+        if not backend.get_player_channel_ids(steam_id):
             # Якщо зв'язків нема - видаляємо гравця повністю
-            supabase.table("players").delete().eq("steam_id", steam_id).execute()
+            backend.delete_player(steam_id)
 
     else:
         # Видаляємо гравця повністю разом зі зв'язками
-        supabase.table("player_channels").delete().eq("steam_id", steam_id).execute()
-        supabase.table("players").delete().eq("steam_id", steam_id).execute()
+        backend.delete_player(steam_id)
 
-async def get_logged_matches(limit=2000, chunk_size=1000):
+    invalidate_rosters(channel_id)
+
+async def get_logged_matches(limit=2000):
     """
-    Отримує останні матчі з matchlog, гарантовано враховуючи більше 1000 записів.
-    limit - загальна кількість останніх матчів для вибірки
-    chunk_size - кількість записів у кожному запиті
+    Отримує останні limit матчів з matchlog
+    (Supabase-бекенд сам читає посторінково, якщо їх більше 1000).
     """
-    matches = []
-    start = 0
-    while start < limit:
-        end = start + chunk_size - 1
-        res = supabase.table("matchlog") \
-            .select("*") \
-            .order("endtime", desc=True) \
-            .range(start, end) \
-            .execute()
-        data = res.data or []
-        if not data:
-            break
-        matches.extend(data)
-        if len(data) < chunk_size:
-            break
-        start += chunk_size
-
-    print(f"DEBUG: Total matches fetched (paginated): {len(matches)}")
-    return matches[:limit]
-
-async def get_logged_match_objects():
-    raw_matches = await get_logged_matches()
-    match_ids = [m["match_id"] for m in raw_matches]
+    with span(log, "get_logged_matches", limit=limit) as info:
+        matches = get_backend().get_matchlog_rows(limit=limit)
+        info["rows"] = len(matches)
+    return matches
 
-    print(f"DEBUG: Total matches fetched: {len(raw_matches)}")
+async def get_existing_matches(match_ids, chunk_size=500) -> dict:
+    """
+    Повертає {match_id: row} лише для переданих match_id, що вже є в matchlog.
+    Вибирає тільки поля, потрібні для is_match_changed.
+    """
+    if not match_ids:
+        return {}
 
-    # Запит гравців за всіма матчами разом
-    players_data = await get_all_match_players(match_ids)
+    existing = {}
+    match_ids = list(match_ids)
+    for i in range(0, len(match_ids), chunk_size):
+        chunk = match_ids[i:i + chunk_size]
+        for row in get_backend().get_matchlog_by_ids(chunk, MATCH_COMPARE_COLUMNS):
+            existing[row["match_id"]] = row
 
-    print(f"DEBUG: Total match_players rows fetched: {len(players_data)}")
+    return existing
 
-    # Групуємо гравців за match_id
-    players_by_match = {}
-    for pd in players_data:
-        players_by_match.setdefault(pd["match_id"], []).append(pd["steam_id"])
+async def get_matchlog_rows_between(since: datetime | None,
+                                    until: datetime | None = None) -> list:
+    """Усі рядки matchlog з since <= endtime < until, від найновіших."""
+    return get_backend().get_matchlog_rows(
+        since=since.isoformat() if since is not None else None,
+        until=until.isoformat() if until is not None else None,
+    )
+
+async def get_logged_match_records():
+    return await build_match_records(await get_logged_matches())
+
+async def get_match_records_since(since: datetime | None):
+    """
+    Дельта для match_store: матчі з endtime >= since (межу включаємо,
+    бо кілька матчів можуть закінчитись в ту саму секунду).
+    """
+    if since is None:
+        return await get_logged_match_records()
+    return await build_match_records(await get_matchlog_rows_between(since))
+
+async def get_match_by_id(match_id) -> Match | None:
+    if match_id is None:
+        return None
+    matches = await build_match_objects(get_backend().get_matchlog_by_ids([match_id]))
+    return matches[0] if matches else None
+
+async def build_match_objects(raw_matches: list) -> List[Match]:
+    """Збирає Match з рядків matchlog, дотягуючи player_ids з match_players."""
+    players_by_match = await _players_by_match(raw_matches)
 
     matches = []
     empty_player_ids = 0
+    # Перевірка рівня один раз на виклик, а не на кожен з ~2000 рядків
+    debug = log.isEnabledFor(DEBUG)
     for m in raw_matches:
-        print(f"[RAW MATCH DEBUG] {m['match_id']} | "
-              f"endtime={m.get('endtime')} | "
-              f"win_status={m.get('win_status')} | "
-              f"solo_status={m.get('solo_status')} | "
-              f"duration={m.get('duration')} | "
-              f"match_mode={m.get('match_mode')}")
+        if debug:
+            sampled(log, "raw_match", "raw match %s", m["match_id"],
+                    endtime=m.get("endtime"), win_status=m.get("win_status"),
+                    solo_status=m.get("solo_status"), duration=m.get("duration"),
+                    match_mode=m.get("match_mode"))
         player_ids = players_by_match.get(m["match_id"], [])
         if not player_ids:
-            print(f"DEBUG: No players for match_id {m['match_id']}, date {m.get('endtime')}")
+            sampled(log, "no_players", "no players for match %s", m["match_id"],
+                    endtime=m.get("endtime"))
             empty_player_ids += 1
 
         dt_endtime = parse_timestamp(m.get("endtime")) if m.get("endtime") else None
 
-        # 🔎 DEBUG: вивести всі дані по матчу
-        # debug_str = " | ".join([
-        #     f"match_id={m.get('match_id')}",
-        #     f"endtime={m.get('endtime')}",
-        #     f"parsed_endtime={dt_endtime}",
-        #     f"duration={m.get('duration')}",
-        #     f"match_mode={m.get('match_mode')}",
-        #     f"win_status={m.get('win_status')}",
-        #     f"solo_status={m.get('solo_status')}",
-        #     f"player_ids={player_ids}"
-        # ])
-        # print(f"[MATCH DEBUG] {debug_str}")
-
         match_obj = Match(
             match_id=m["match_id"],
             win_status=bool(m["win_status"]),
@@ -259,9 +286,57 @@ async def get_logged_match_objects():
         )
         matches.append(match_obj)
 
-    print(f"DEBUG: Matches with empty player_ids: {empty_player_ids}")
+    log.debug("built match objects",
+              extra=kv(matches=len(matches), empty_player_ids=empty_player_ids))
     return matches
 
+async def build_match_records(raw_matches: list) -> List[MatchRecord]:
+    """
+    Як build_match_objects, але одразу в MatchRecord для match_store:
+    без Match і без datetime на кожен рядок, endtime — epoch-секунди.
+    """
+    players_by_match = await _players_by_match(raw_matches)
+    records = []
+    for m in raw_matches:
+        endtime = parse_timestamp(m.get("endtime")) if m.get("endtime") else None
+        solo_status = m.get("solo_status")
+        records.append(MatchRecord(
+            match_id=m["match_id"],
+            player_ids=tuple(players_by_match.get(m["match_id"], ())),
+            win_status=bool(m["win_status"]),
+            end_ts=int(endtime.timestamp()) if endtime is not None else None,
+            duration=m.get("duration"),
+            solo_status=bool(solo_status) if solo_status is not None else None,
+            match_mode=m.get("match_mode"),
+        ))
+    return records
+
+async def _players_by_match(raw_matches: list) -> dict:
+    """match_id -> steam_id гравців із match_players, одним пакетом на всі матчі."""
+    match_ids = [m["match_id"] for m in raw_matches]
+
+    # Запит гравців за всіма матчами разом
+    with span(log, "get_all_match_players", matches=len(match_ids)) as info:
+        players_data = await get_all_match_players(match_ids)
+        info["rows"] = len(players_data)
+
+    # Групуємо гравців за match_id
+    players_by_match = {}
+    for pd in players_data:
+        players_by_match.setdefault(pd["match_id"], []).append(pd["steam_id"])
+    return players_by_match
+
+def matchlog_row(m: Match) -> dict:
+    return {
+        "match_id": m.match_id,
+        "player_ids": m.player_ids,  # ✅ додаємо в matchlog
+        "win_status": int(m.win_status),
+        "solo_status": int(m.solo_status) if m.solo_status is not None else None,
+        "endtime": m.endtime.isoformat() if isinstance(m.endtime, datetime) else m.endtime,
+        "duration": m.duration,
+        "match_mode": m.match_mode
+    }
+
 async def add_matches(matches: List[Match]) -> bool:
 
     """
@@ -274,70 +349,205 @@ async def add_matches(matches: List[Match]) -> bool:
     match_players_rows = []
 
     for m in matches:
-        matchlog_rows.append({
-            "match_id": m.match_id,
-            "player_ids": m.player_ids,  # ✅ додаємо в matchlog
-            "win_status": int(m.win_status),
-            "solo_status": int(m.solo_status) if m.solo_status is not None else None,
-            "endtime": m.endtime.isoformat() if isinstance(m.endtime, datetime) else m.endtime,
-            "duration": m.duration,
-            "match_mode": m.match_mode
-        })
+        matchlog_rows.append(matchlog_row(m))
 
         match_players_rows.extend(
             {"match_id": m.match_id, "steam_id": pid}
             for pid in m.player_ids
         )
 
+    backend = get_backend()
     # Запис у matchlog
-    res1 = supabase.table("matchlog").upsert(matchlog_rows, on_conflict="match_id").execute()
-    if res1.data is None:
-        print("❌ Error inserting into matchlog:", res1)
+    if not backend.upsert_matchlog(matchlog_rows):
         return False
 
     # Запис у match_players
-    res2 = supabase.table("match_players").upsert(match_players_rows).execute()
-    if res2.data is None:
-        print("❌ Error inserting into match_players:", res2)
+    if not backend.upsert_match_players(match_players_rows):
         return False
 
-    print(f"✅ Added {len(matches)} matches to DB")
+    match_store.apply(matches)
+    await refresh_rollups_for(matches)
+    log.info("added %d matches", len(matches))
     return True
 
 async def update_match(match: Match) -> bool:
     """
     Оновлює дані матчу в matchlog та синхронізує match_players.
     """
-    res1 = supabase.table("matchlog").update({
-        "player_ids": match.player_ids,  # ✅ оновлюємо тут теж
-        "win_status": int(match.win_status),
-        "solo_status": int(match.solo_status) if match.solo_status is not None else None,
-        "endtime": match.endtime.isoformat() if isinstance(match.endtime, datetime) else match.endtime,
-        "duration": match.duration,
-        "match_mode": match.match_mode
-    }).eq("match_id", match.match_id).execute()
-
-    if res1.data is None:
-        print(f"❌ Error updating matchlog for {match.match_id}: {res1}")
-        return False
+    return await reconcile_matches([match])
 
-    # Видаляємо старі зв’язки гравців
-    supabase.table("match_players").delete().eq("match_id", match.match_id).execute()
+async def _run_pipelined(calls: list) -> list:
+    """
+    Виконує блокуючі виклики сховища паралельно в потоках,
+    не більше WRITE_CONCURRENCY одночасно.
+    """
+    semaphore = asyncio.Semaphore(WRITE_CONCURRENCY)
 
-    # Додаємо актуальні
-    match_players_rows = [
-        {"match_id": match.match_id, "steam_id": pid}
-        for pid in match.player_ids
-    ]
-    res2 = supabase.table("match_players").insert(match_players_rows).execute()
+    async def run(call):
+        async with semaphore:
+            return await asyncio.to_thread(call)
+
+    return await asyncio.gather(*(run(c) for c in calls))
+
+async def reconcile_matches(matches: List[Match], chunk_size=500,
+                            replace_players: bool = False) -> bool:
+    """
+    Масове оновлення змінених матчів: один upsert matchlog на чанк і
+    синхронізація match_players різницею множин — додаємо лише відсутні зв'язки.
+    replace_players=True — player_ids повні (звірка по всьому ростеру), тож
+    зв'язки, яких у них нема, видаляємо; інакше неповний список стер би чужі зв'язки.
+    """
+    if not matches:
+        return True
 
-    if res2.data is None:
-        print(f"❌ Error updating match_players for {match.match_id}: {res2}")
+    backend = get_backend()
+    rows = [matchlog_row(m) for m in matches]
+    results = await _run_pipelined([
+        partial(backend.upsert_matchlog, rows[i:i + chunk_size])
+        for i in range(0, len(rows), chunk_size)
+    ])
+    if not all(results):
+        return False
+
+    desired = {(m.match_id, pid) for m in matches for pid in m.player_ids}
+    existing = {
+        (row["match_id"], row["steam_id"])
+        for row in await get_all_match_players([m.match_id for m in matches], chunk_size)
+    }
+    to_insert = [{"match_id": mid, "steam_id": sid} for mid, sid in desired - existing]
+    stale_by_match = {}
+    if replace_players:
+        for mid, sid in existing - desired:
+            stale_by_match.setdefault(mid, []).append(sid)
+
+    calls = [
+        partial(backend.insert_match_players, to_insert[i:i + chunk_size])
+        for i in range(0, len(to_insert), chunk_size)
+    ]
+    calls.extend(
+        partial(backend.delete_match_players, mid, sids)
+        for mid, sids in stale_by_match.items()
+    )
+    results = await _run_pipelined(calls)
+    if not all(results):
+        log.error("syncing match_players failed")
         return False
 
-    print(f"♻️ Updated match {match.match_id}")
+    match_store.apply(matches)
+    await refresh_rollups_for(matches)
+    log.info("reconciled %d matches", len(matches), extra=kv(
+        links_added=len(to_insert), links_removed=sum(map(len, stale_by_match.values()))))
     return True
 
+# Rollup-и по днях: (steam_id, day, match_mode) -> games, wins, solo, тривалості.
+# steam_id = ALL_MATCHES_ID — підсумок по матчах загалом. Схема — в rebuild_rollups.py
+# (для SQLite — в sqlite_storage.py)
+# Скільки днів перераховуємо за один прохід бекфілу
+ROLLUP_CHUNK_DAYS = 30
+_rollups_complete = False  # бекфіл уже перевірено в цьому процесі
+_rollups_lock = asyncio.Lock()
+
+async def get_rollups(since_day: date | None = None) -> list:
+    return get_backend().get_rollups(since_day.isoformat() if since_day is not None else None)
+
+async def get_oldest_match_endtime() -> datetime | None:
+    oldest = get_backend().get_oldest_endtime()
+    if oldest is None:
+        return None
+    return parse_timestamp(oldest)
+
+async def rebuild_rollups(since: date | None = None, until: date | None = None) -> int:
+    """
+    Перераховує rollup від since (типово — день найстаршого матчу) до until
+    (типово — сьогодні) чанками по ROLLUP_CHUNK_DAYS. Повертає кількість рядків.
+    """
+    if since is None:
+        oldest = await get_oldest_match_endtime()
+        if oldest is None:
+            return 0
+        since = oldest.astimezone(timezone.utc).date()
+    last_day = until or datetime.now(timezone.utc).date()
+    start = since
+    total_rows = 0
+    while start <= last_day:
+        end = min(start + timedelta(days=ROLLUP_CHUNK_DAYS - 1), last_day)
+        total_rows += await refresh_rollups(start, end)
+        log.info("rollups %s .. %s done", start, end, extra=kv(rows=total_rows))
+        start = end + timedelta(days=1)
+    return total_rows
+
+async def ensure_rollups() -> bool:
+    """
+    Чи покривають rollup-и весь matchlog. Після деплою add_matches пише rollup
+    лише за свої дні, тож якщо для дня найстаршого матчу rollup нема —
+    один раз перераховуємо все. False — покриття неповне (звіти йдуть по матчах).
+    """
+    global _rollups_complete
+    if _rollups_complete:
+        return True
+    async with _rollups_lock:
+        if _rollups_complete:
+            return True
+        try:
+            oldest = await get_oldest_match_endtime()
+            if oldest is not None:
+                day = oldest.astimezone(timezone.utc).date().isoformat()
+                if not get_backend().get_rollups(day, day, columns="day"):
+                    with span(log, "rollup_backfill", since=day, level=INFO) as info:
+                        info["rows"] = await rebuild_rollups()
+        except Exception as e:
+            # Нема таблиці rollup чи збій сховища — звіти підуть по сирих матчах
+            log.error("rollup coverage check failed: %r", e)
+            return False
+        _rollups_complete = True
+        return True
+
+async def refresh_rollups(start_day: date, end_day: date, chunk_size=500) -> int:
+    """
+    Перераховує rollup за дні [start_day, end_day] з matchlog.
+    Повертає кількість записаних rollup-рядків.
+    """
+    since = datetime.combine(start_day, dt_time.min, tzinfo=timezone.utc)
+    until = datetime.combine(end_day + timedelta(days=1), dt_time.min, tzinfo=timezone.utc)
+    matches = await build_match_objects(await get_matchlog_rows_between(since, until))
+    rows = compute_daily_rollups(matches)
+
+    backend = get_backend()
+    for i in range(0, len(rows), chunk_size):
+        backend.upsert_rollups(rows[i:i + chunk_size])
+
+    # Прибираємо ключі, яких більше нема (напр. матч змінив режим)
+    fresh_keys = {(r["steam_id"], r["day"], r["match_mode"]) for r in rows}
+    existing = backend.get_rollups(
+        start_day.isoformat(), end_day.isoformat(), columns="steam_id, day, match_mode"
+    )
+    for r in existing:
+        if (r["steam_id"], r["day"], r["match_mode"]) not in fresh_keys:
+            backend.delete_rollup(r["steam_id"], r["day"], r["match_mode"])
+
+    return len(rows)
+
+async def refresh_rollups_for(matches: List[Match]):
+    """Оновлює rollup за ті дні, яких торкнулись записані матчі."""
+    days = sorted({
+        m.endtime.astimezone(timezone.utc).date()
+        for m in matches
+        if isinstance(m.endtime, datetime)
+    })
+    # Зливаємо сусідні дні в діапазони, щоб не робити запит на кожен
+    ranges = []
+    for day in days:
+        if ranges and day - ranges[-1][1] <= timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    try:
+        for start_day, end_day in ranges:
+            await refresh_rollups(start_day, end_day)
+    except Exception as e:
+        # Rollup можна відновити rebuild_rollups.py, запис матчів через це не валимо
+        log.error("refreshing rollups failed: %r", e)
+
 #misc for db operating
 def parse_timestamp(ts_str):
     try:
@@ -354,14 +564,6 @@ async def get_all_match_players(match_ids, chunk_size=500):
 
     for i in range(0, len(match_ids), chunk_size):
         chunk = match_ids[i:i + chunk_size]
-
-        res = (
-            supabase.table("match_players")
-            .select("match_id, steam_id")
-            .in_("match_id", chunk)
-            .execute()
-        )
-
-        all_players.extend(res.data or [])
+        all_players.extend(get_backend().get_match_players(chunk))
 
     return all_players
\ No newline at end of file
@@ -5,9 +5,12 @@ import datetime
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
+from logs import get_logger
 
 load_dotenv()
 
+log = get_logger("discord")
+
 TOKEN = os.getenv('DISCORD_TOKEN')
 
 players = []
@@ -45,7 +48,7 @@ def get_solo_losses():
 
 @bot.event
 async def on_ready():
-    print(f"Бот {bot.user} запущений і готовий до роботи!")
+    log.info("bot %s is ready", bot.user)
 
 @bot.command()
 async def ping(ctx):
@@ -61,7 +64,7 @@ async def stats(ctx):
     for player in players:
         stats.append(player.fetch_and_count_games())
         message = "\n".join(stats)
-    print(message)
+    log.debug(message)
 
     await ctx.send(message)
 
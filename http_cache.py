@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+import local_store
+
+# Скільки відповідей тримаємо в пам'яті на один кеш
+CACHE_SIZE = int(os.getenv("HTTP_CACHE_SIZE", "2000"))
+# Прострочені записи з валідаторами ще годяться для умовного запиту (304)
+STALE_KEEP = float(os.getenv("HTTP_CACHE_STALE_KEEP", str(24 * 3600)))
+
+
+@dataclass
+class CacheEntry:
+    body: Any
+    expires_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
+    def fresh(self, now: float | None = None) -> bool:
+        return (time.time() if now is None else now) < self.expires_at
+
+    def validators(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Parsed JSON responses by request key: a bounded in-memory LRU, optionally
+    backed by the local state DB, with one in-flight fetch per key.
+    Cached bodies are shared between callers and must not be modified.
+    """
+
+    def __init__(self, name: str, size: int = CACHE_SIZE, disk: bool = False):
+        self.name = name
+        self.size = size
+        self.disk = disk
+        self._lru: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._table_ready = False
+
+    @staticmethod
+    def key(path: str, params: list[tuple[str, str]] | None = None) -> str:
+        """path plus the query pairs in a canonical order."""
+        if not params:
+            return path
+        return f"{path}?" + "&".join(f"{k}={v}" for k, v in sorted(params))
+
+    def _db(self):
+        conn = local_store.get_connection()
+        if not self._table_ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS http_cache ("
+                " cache TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " body TEXT NOT NULL,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (cache, key)) WITHOUT ROWID"
+            )
+            # Записи, надто старі навіть для умовного запиту, прибираємо при відкритті
+            conn.execute(
+                "DELETE FROM http_cache WHERE cache = ? AND expires_at < ?",
+                (self.name, time.time() - STALE_KEEP),
+            )
+            self._table_ready = True
+        return conn
+
+    def _remember(self, key: str, entry: CacheEntry):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+
+    def get(self, key: str) -> CacheEntry | None:
+        """Entry for key, fresh or stale; memory first, then the disk tier."""
+        entry = self._lru.get(key)
+        if entry is not None:
+            self._lru.move_to_end(key)
+            return entry
+        if not self.disk:
+            return None
+        row = self._db().execute(
+            "SELECT body, etag, last_modified, expires_at FROM http_cache"
+            " WHERE cache = ? AND key = ?",
+            (self.name, key),
+        ).fetchone()
+        if row is None:
+            return None
+        entry = CacheEntry(json.loads(row[0]), row[3], row[1], row[2])
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry):
+        self._remember(key, entry)
+        if self.disk:
+            self._db().execute(
+                "INSERT OR REPLACE INTO http_cache"
+                " (cache, key, body, etag, last_modified, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.name, key, json.dumps(entry.body), entry.etag, entry.last_modified,
+                 entry.expires_at),
+            )
+
+    def refresh(self, key: str, entry: CacheEntry, expires_at: float):
+        """Extends an entry after the upstream confirmed it unchanged (304)."""
+        entry.expires_at = expires_at
+        self._remember(key, entry)
+        if self.disk:
+            self._db().execute(
+                "UPDATE http_cache SET expires_at = ? WHERE cache = ? AND key = ?",
+                (expires_at, self.name, key),
+            )
+
+    def clear(self):
+        self._lru.clear()
+        if self.disk:
+            self._db().execute("DELETE FROM http_cache WHERE cache = ?", (self.name,))
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def singleflight(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs fetch once for concurrent callers with the same key; all get its result."""
+        loop = asyncio.get_running_loop()
+        fut = self._inflight.get(key)
+        if fut is not None and fut.get_loop() is loop:
+            # shield: скасування одного з очікувачів не скасовує спільний запит
+            return await asyncio.shield(fut)
+        fut = loop.create_task(fetch())
+        self._inflight[key] = fut
+        fut.add_done_callback(lambda f: self._drop_inflight(key, f))
+        return await asyncio.shield(fut)
+
+    def _drop_inflight(self, key: str, fut: asyncio.Future):
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
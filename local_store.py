@@ -0,0 +1,28 @@
+import os
+import sqlite3
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Локальний файл стану бота (кеші, службові мітки) — не плутати з основною БД
+STATE_DB_PATH = os.getenv("BOT_STATE_DB", "bot_state.sqlite3")
+
+_conn: sqlite3.Connection | None = None
+
+
+def get_connection() -> sqlite3.Connection:
+    """Returns the process-wide connection to the local state database."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(STATE_DB_PATH, isolation_level=None, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+    return _conn
+
+
+def close_connection():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+    _conn = None
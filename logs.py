@@ -0,0 +1,159 @@
+"""
+Leveled logging for the bot, one logger per subsystem ("db", "collector", ...).
+
+    LOG_LEVEL=INFO             # level for every subsystem
+    LOG_DEBUG=db,reports       # subsystems switched to DEBUG ("all" for every one)
+    LOG_FORMAT=json            # one JSON object per line instead of text
+
+Per-row events go through `sampled` and timings through `span`; both return
+before doing any work when their level is disabled.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+ROOT = "shiftbot"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DEBUG = {s.strip() for s in os.getenv("LOG_DEBUG", "").split(",") if s.strip()}
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Скільки однакових подій на ключ пропускаємо за вікно; решту лише рахуємо
+SAMPLE_LIMIT = int(os.getenv("LOG_SAMPLE_LIMIT", "20"))
+SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", "60"))
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+_configured = False
+_debug: set = set()
+_configure_lock = threading.Lock()
+
+
+def kv(**fields) -> dict:
+    """Structured fields for a record: log.info("msg", extra=kv(rows=10))."""
+    return {"fields": fields}
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = (f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<7} "
+                f"[{record.name.removeprefix(ROOT + '.')}] {record.getMessage()}")
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "subsystem": record.name.removeprefix(ROOT + "."),
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure(level: str | None = None, debug: set | None = None, fmt: str | None = None):
+    """(Re)applies levels and output format; called implicitly by get_logger."""
+    global _configured, _debug
+    with _configure_lock:
+        root = logging.getLogger(ROOT)
+        root.setLevel(level or LOG_LEVEL)
+        root.propagate = False
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+        root.addHandler(handler)
+
+        _debug = LOG_DEBUG if debug is None else set(debug)
+        for name, logger in logging.Logger.manager.loggerDict.items():
+            if isinstance(logger, logging.Logger) and name.startswith(ROOT + "."):
+                _apply_level(logger)
+        _configured = True
+
+
+def _apply_level(logger: logging.Logger):
+    subsystem = logger.name.removeprefix(ROOT + ".")
+    logger.setLevel(DEBUG if "all" in _debug or subsystem in _debug else logging.NOTSET)
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    if not _configured:
+        configure()
+    logger = logging.getLogger(f"{ROOT}.{subsystem}")
+    _apply_level(logger)
+    return logger
+
+
+class _Sampler:
+    """Lets through SAMPLE_LIMIT events per key per window and counts the rest."""
+
+    def __init__(self):
+        self._windows: dict[tuple, list] = {}  # key -> [window_start, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def admit(self, key: tuple, limit: int, window: float) -> int | None:
+        """None to drop the event, otherwise how many were suppressed before it."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= window:
+                suppressed = state[2] if state else 0
+                self._windows[key] = [now, 1, 0]
+                return suppressed
+            if state[1] < limit:
+                state[1] += 1
+                return 0
+            state[2] += 1
+            return None
+
+
+_sampler = _Sampler()
+
+
+def sampled(logger: logging.Logger, key: str, msg: str, *args, level: int = DEBUG,
+            limit: int = SAMPLE_LIMIT, window: float = SAMPLE_WINDOW, **fields):
+    """Logs a per-row event, at most `limit` per `window` seconds for this key."""
+    if not logger.isEnabledFor(level):
+        return
+    suppressed = _sampler.admit((logger.name, key), limit, window)
+    if suppressed is None:
+        return
+    if suppressed:
+        fields["suppressed"] = suppressed
+    logger.log(level, msg, *args, extra=kv(**fields))
+
+
+@contextmanager
+def span(logger: logging.Logger, name: str, level: int = DEBUG, **fields):
+    """
+    Times the block and logs `name` with duration_ms and the fields on exit.
+    The yielded dict can be filled in the block (e.g. row counts).
+    """
+    if not logger.isEnabledFor(level):
+        yield fields
+        return
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        fields.update(span=name, status=status,
+                      duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        logger.log(level, name, extra=kv(**fields))
@@ -1,9 +1,24 @@
 import asyncio
+import os
 from datetime import datetime, timedelta, timezone
 from typing import List
-from db import get_channel_players, add_matches, update_match, get_logged_matches
-from match_stats import Match, is_player_solo_in_match
+from db import get_channel_players, add_matches, reconcile_matches, get_existing_matches
+from match_stats import MATCH_LIST_FIELDS, Match, is_player_solo_in_match
 from core import player_win, get_match_end_time
+from watermarks import get_watermarks, advance_watermarks
+from metrics import record_collect
+from logs import get_logger, kv, sampled, span
+
+# Скільки гравців опитуємо і скільки solo-check'ів тримаємо одночасно
+PLAYER_FETCH_CONCURRENCY = int(os.getenv("COLLECT_PLAYER_CONCURRENCY", "8"))
+ENRICH_CONCURRENCY = int(os.getenv("COLLECT_ENRICH_CONCURRENCY", "20"))
+# Як часто плановий збір перечитує повне вікно замість інкрементального (секунди)
+RECONCILE_INTERVAL = int(os.getenv("COLLECT_RECONCILE_INTERVAL", str(6 * 3600)))
+# Свіжий матч STRATZ часто ще "не знає"; поки матч у вікні сповіщень, питаємо знову
+# не рідше ніж раз на стільки секунд, а не раз на SOLO_NOT_FOUND_TTL
+PENDING_SOLO_RETRY = int(os.getenv("COLLECT_PENDING_SOLO_RETRY", "300"))
+
+log = get_logger("collector")
 
 def parse_player_ids(raw_player_ids):
     if isinstance(raw_player_ids, str):
@@ -30,7 +45,7 @@ def parse_datetime(dt):
 def is_match_changed(db_match: dict, new_match: "Match") -> bool:
     """
     Порівнює матч із бази та новий матч.
-    Ігнорує різницю у player_ids, бо ми їх не зберігаємо в БД.
+    player_ids порівнюються як множини: порядок гравців не є зміною.
     Вважає, що None в новому матчі — це відсутність зміни.
     """
 
@@ -52,45 +67,34 @@ def is_match_changed(db_match: dict, new_match: "Match") -> bool:
                 return True
             if db_dt.timestamp() != new_dt.timestamp():
                 return True
+        elif field == "player_ids":
+            if set(parse_player_ids(db_value)) != set(new_value):
+                return True
         else:
             if db_value != new_value:
                 return True
     return False
 
 
-async def fetch_and_log_matches_for_last_day(channel_id: str, days: int = 1):
+def merge_raw_matches(players: list, raw_by_player: list, days: int) -> tuple[dict, list]:
     """
-    Отримує нові матчі за останні `days` днів для всіх гравців каналу
-    і записує їх у Supabase.
+    Зводить сирі матчі OpenDota всіх гравців в один словник match_id -> Match.
+    Порядок обходу — порядок ростера, тож результат детермінований
+    незалежно від того, в якому порядку завершились запити.
+    Повертає (match_dict, solo_checks), де solo_checks — пари (match_id, steam_id).
     """
-    # 1. Беремо гравців тільки цього каналу
-    players = await get_channel_players(channel_id)
-    known_ids = [p.steam_id for p in players]
-
-    # 2. Беремо вже залоговані матчі
-    logged_matches = await get_logged_matches()
-    logged_ids_set = {m["match_id"] for m in logged_matches}
-    print(f"Checking {days} days...")
-    print(f"📦 Loaded {len(logged_ids_set)} existing matches from DB")
-
+    known_ids = {p.steam_id for p in players}
+    cutoff_time = datetime.now(timezone.utc) - timedelta(days=days)
     match_dict = {}
+    solo_checks = []
 
-    # 3. Для кожного гравця тягнемо матчі
-    for player in players:
+    for player, raw_matches in zip(players, raw_by_player):
         steam_id = player.steam_id
-        print(f"🔍 Fetching matches for {player.name.get('telegram')}")
-
-        raw_matches = await Match.get_recent_matches(steam_id, days=days)
-        if not raw_matches:
-            continue
-
-        for raw in raw_matches:
+        for raw in raw_matches or []:
             match_id = raw["match_id"]
 
             # Фільтр по даті
             end_time = get_match_end_time(raw)
-            cutoff_time = datetime.now(timezone.utc) - timedelta(days=days)
-            """print(f"[DEBUG] {match_id=} {end_time=} cutoff={cutoff_time}")"""
             if end_time < cutoff_time:
                 continue
 
@@ -107,39 +111,193 @@ async def fetch_and_log_matches_for_last_day(channel_id: str, days: int = 1):
                 if p.get("account_id") in known_ids
             ] or [steam_id]
 
-            # Solo-check
-            solo_status = await is_player_solo_in_match(match_id, steam_id)
+            # Solo-check робимо пізніше, паралельно
+            solo_checks.append((match_id, steam_id))
 
             # Запис матчу
             match_dict[match_id] = Match(
                 match_id=match_id,
                 player_ids=match_player_ids,
                 win_status=player_win(raw),
-                solo_status=solo_status,
+                solo_status=None,
                 endtime=end_time,
                 duration=raw.get("duration", 0),
                 match_mode=raw.get("game_mode", 0)
             )
 
-    # 4. Розділяємо на нові та існуючі
+    return match_dict, solo_checks
+
+
+def merge_stored_player_ids(match: "Match", db_match: dict):
+    """Додає до player_ids матчу гравців, уже записаних для нього в БД (спершу збережених)."""
+    stored = parse_player_ids(db_match.get("player_ids"))
+    match.player_ids = list(dict.fromkeys([*stored, *match.player_ids]))
+
+
+async def fetch_players_matches(players: list, days: int, marks: dict | None = None) -> list:
+    """
+    Тягне матчі всіх гравців паралельно, не більше PLAYER_FETCH_CONCURRENCY одночасно.
+    Якщо для гравця є watermark, повертаються лише матчі, новіші за нього.
+    Для гравця, чий запит не вдався, на його місці None (а не порожній список).
+    """
+    semaphore = asyncio.Semaphore(PLAYER_FETCH_CONCURRENCY)
+    marks = marks or {}
+
+    async def fetch(player):
+        last_match_id = marks.get(player.steam_id)
+        async with semaphore:
+            sampled(log, "fetch_player", "fetching matches for %s", player.steam_id)
+            raw_matches = await Match.get_recent_matches(
+                player.steam_id, days=days, after_match_id=last_match_id,
+                project=MATCH_LIST_FIELDS, strict=True,
+            )
+        if raw_matches is None:
+            return None
+        if last_match_id is not None:
+            # Фільтруємо й самі, на випадок якщо OpenDota проігнорує параметр
+            raw_matches = [r for r in raw_matches if r["match_id"] > last_match_id]
+        return raw_matches
+
+    return await asyncio.gather(*(fetch(p) for p in players))
+
+
+def newest_match_ids(players: list, raw_by_player: list) -> dict[int, int]:
+    """steam_id -> найбільший match_id серед отриманих, для просування watermark."""
+    return {
+        player.steam_id: max(r["match_id"] for r in raw_matches)
+        for player, raw_matches in zip(players, raw_by_player)
+        if raw_matches
+    }
+
+
+async def resolve_solo_statuses(match_dict: dict, solo_checks: list,
+                                not_found_ttl: float | None = None):
+    """Solo-check для нових матчів; STRATZ-резолвер склеює одночасні запити в батчі."""
+    semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+
+    async def check(match_id, steam_id):
+        async with semaphore:
+            return await is_player_solo_in_match(match_id, steam_id, not_found_ttl)
+
+    solo_results = await asyncio.gather(*(check(mid, sid) for mid, sid in solo_checks))
+    for (match_id, _), solo_status in zip(solo_checks, solo_results):
+        match_dict[match_id].solo_status = solo_status
+
+
+async def resolve_pending_solo(matches: list) -> int:
+    """
+    Повторний solo-check для збережених матчів без solo_status (STRATZ ще не
+    відповів); визначені записує в БД. Повертає кількість визначених.
+    """
+    pending = [m for m in matches if m.solo_status is None and m.player_ids]
+    if not pending:
+        return 0
+    match_dict = {
+        m.match_id: Match(
+            match_id=m.match_id,
+            player_ids=list(m.player_ids),
+            win_status=m.win_status,
+            endtime=m.endtime,
+            duration=m.duration,
+            solo_status=None,
+            match_mode=m.match_mode,
+        )
+        for m in pending
+    }
+    await resolve_solo_statuses(match_dict, [(m.match_id, m.player_ids[0]) for m in pending],
+                                not_found_ttl=PENDING_SOLO_RETRY)
+    resolved = [m for m in match_dict.values() if m.solo_status is not None]
+    if resolved:
+        await reconcile_matches(resolved)
+    return len(resolved)
+
+
+async def fetch_and_log_matches_for_last_day(channel_id: str, days: int = 1,
+                                             incremental: bool = True):
+    """
+    Отримує нові матчі за останні `days` днів для всіх гравців каналу
+    і записує їх у Supabase.
+    """
+    players = await get_channel_players(channel_id)
+    return await collect_matches(players, days, incremental)
+
+
+async def collect_for_channels(channels: list, days: int = 1, incremental: bool = True,
+                               full_roster: bool = False):
+    """
+    Один прохід збору для кількох каналів: гравець, якого відстежують у
+    кількох чатах, опитується (і перевіряється в STRATZ) лише раз.
+    full_roster=True — channels це всі канали бота (див. collect_matches).
+    """
+    rosters = await asyncio.gather(*(get_channel_players(c) for c in channels))
+    players = {}
+    for roster in rosters:
+        for player in roster:
+            players.setdefault(player.steam_id, player)
+    log.info("%d distinct players across %d channels", len(players), len(channels))
+    return await collect_matches(list(players.values()), days, incremental, full_roster)
+
+
+async def collect_matches(players: list, days: int = 1, incremental: bool = True,
+                          full_roster: bool = False) -> tuple[list, list]:
+    """
+    Збирає матчі гравців за останні `days` днів і записує їх у БД.
+    incremental=True — питаємо OpenDota лише про матчі, новіші за watermark гравця.
+    incremental=False — звірка: перечитуємо все вікно, щоб is_match_changed
+    підхопив пізні виправлення даних (напр. solo_status після збою STRATZ).
+    full_roster=True — players це всі відстежувані гравці; лише тоді неінкрементальний
+    прохід бачить повні player_ids і може прибрати зайві зв'язки match_players.
+    Інакше (поллер, один канал) до знайдених гравців додаються збережені в БД.
+    Повертає (нові матчі, оновлені матчі).
+    """
+    # 1. Watermark-и гравців
+    marks = get_watermarks([p.steam_id for p in players]) if incremental else {}
+
+    # 2. Тягнемо матчі всіх гравців паралельно і зводимо їх
+    with span(log, "fetch_players_matches", players=len(players), days=days):
+        raw_by_player = await fetch_players_matches(players, days, marks)
+    match_dict, solo_checks = merge_raw_matches(players, raw_by_player, days)
+
+    # 3. Перевіряємо в БД лише знайдені match_id, а не всю історію
+    logged_matches = await get_existing_matches(match_dict.keys())
+    log.debug("%d of %d candidate matches already in DB", len(logged_matches), len(match_dict))
+
+    # 4. Solo-check
+    await resolve_solo_statuses(match_dict, solo_checks)
+
+    # 5. Розділяємо на нові та існуючі
     new_matches = []
     updated_matches = []
 
+    replace_players = full_roster and not incremental
+    # Гравці, чий запит не вдався: їхня відсутність у матчі нічого не означає
+    failed = {p.steam_id for p, raw in zip(players, raw_by_player) if raw is None}
     for match_id, match in match_dict.items():
-        if match_id not in logged_ids_set:
+        db_match = logged_matches.get(match_id)
+        if db_match is None:
             new_matches.append(match)
-        else:
-            db_match = next((m for m in logged_matches if m["match_id"] == match_id), None)
-            if db_match and is_match_changed(db_match, match):
-                updated_matches.append(match)
+            continue
+        if not replace_players or failed.intersection(
+                parse_player_ids(db_match.get("player_ids"))):
+            # Гравці поза цим проходом (за watermark-ом, з іншого каналу, не в черзі
+            # поллера чи із запитом, що не вдався) теж були в матчі
+            merge_stored_player_ids(match, db_match)
+        if is_match_changed(db_match, match):
+            updated_matches.append(match)
 
-    # 5. Пишемо в базу
+    # 6. Пишемо в базу
+    written = True
     if new_matches:
-        print(f"🆕 Adding {len(new_matches)} new matches...")
-        await add_matches(new_matches)
+        written = await add_matches(new_matches)
+
+    if updated_matches:
+        await reconcile_matches(updated_matches, replace_players=replace_players)
 
-    for match in updated_matches:
-        print(f"♻️ Updating match {match.match_id}...")
-        await update_match(match)
+    # 7. Просуваємо watermark лише після успішного запису, інакше матчі загубляться
+    if written:
+        advance_watermarks(newest_match_ids(players, raw_by_player))
 
-    print(f"✅ Done! Added {len(new_matches)}, updated {len(updated_matches)} matches.")
\ No newline at end of file
+    record_collect(len(new_matches) if written else 0, len(updated_matches))
+    log.info("collect done", extra=kv(days=days, incremental=incremental,
+                                      added=len(new_matches), updated=len(updated_matches)))
+    return new_matches, updated_matches
\ No newline at end of file
@@ -1,47 +1,76 @@
-import aiohttp
 import asyncio
+import os
 import db
+import opendota_client
+import parse_ledger
+from rate_limiter import BACKFILL, priority
 from core import get_accusative_case, day_cases
+from logs import WARNING, get_logger, sampled
 
-async def get_matches(session, steam_id, days):
+log = get_logger("parser")
+
+# Скільки запитів до OpenDota парсер тримає одночасно
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "4"))
+# version == None означає, що матч ще не розпарсений
+PARSER_FIELDS = ("match_id", "version")
+
+async def get_matches(steam_id, days):
     """Returns JSON of a player's recent matches."""
-    url = f'https://api.opendota.com/api/players/{steam_id}/matches'
-    params = {"date": days}  # Fetch matches based on the 'days' parameter
-    async with session.get(url, params=params) as response:
-        if response.status != 200:
-            print(f"[Error] Failed to fetch matches for {steam_id}")
-            return []
-        matches = await response.json()
-        print(f"[OK] Fetched {len(matches)} matches for {steam_id}")
-        return matches
-
-async def request_parse(session, match_id):
+    # Fetch matches based on the 'days' parameter
+    matches = await opendota_client.get_player_matches(steam_id, project=PARSER_FIELDS,
+                                                        date=days)
+    if matches is None:
+        log.warning("failed to fetch matches for %s", steam_id)
+        return []
+    sampled(log, "fetched", "fetched %d matches for %s", len(matches), steam_id)
+    return matches
+
+async def request_parse(match_id):
     """Requests OpenDota to parse a given match."""
-    url = f'https://api.opendota.com/api/request/{match_id}'
-    async with session.post(url) as response:
-        if response.status == 200:
-            print(f"[Parse Requested] Match {match_id}")
-        else:
-            print(f"[Failed] Could not request parse for {match_id}")
-        return await response.json()
+    response = await opendota_client.request_parse(match_id)
+    if response is not None:
+        sampled(log, "requested", "parse requested for match %s", match_id)
+    else:
+        sampled(log, "request_failed", "could not request parse for match %s", match_id,
+                level=WARNING)
+    return response
+
+async def _run_pool(items: list, worker_fn) -> list:
+    """Runs worker_fn over items with at most PARSE_WORKERS calls in flight, keeping order."""
+    results = [None] * len(items)
+    queue = iter(enumerate(items))
+
+    async def worker():
+        for i, item in queue:
+            results[i] = await worker_fn(item)
+
+    await asyncio.gather(*(worker() for _ in range(min(PARSE_WORKERS, len(items)))))
+    return results
 
 async def check_and_parse_matches(days, send_message_callback=None):
-    print(f"\n[Start] Checking matches to parse from the last {days} days...")
-    players = await db.get_players()
-    async with aiohttp.ClientSession() as session:
-        tasks = [get_matches(session, player.steam_id, days) for player in players]
-        results = await asyncio.gather(*tasks)
-
-        parse_tasks = []
-        for matches in results:
-            for match in matches:
-                if match.get("version") is None:  # Unparsed game
-                    parse_tasks.append(request_parse(session, match["match_id"]))
-
-        if parse_tasks:
-            await asyncio.gather(*parse_tasks)
-        else:
-            print("[Done] No matches needed parsing.")
+    log.info("checking matches to parse from the last %d days", days)
+    players = db.get_players()
+    results = await _run_pool([player.steam_id for player in players],
+                              lambda steam_id: get_matches(steam_id, days))
+
+    # Один матч приходить від кожного гравця паті — дедуплікуємо
+    unparsed, parsed = set(), set()
+    for matches in results:
+        for match in matches:
+            (unparsed if match.get("version") is None else parsed).add(match["match_id"])
+    parse_ledger.mark_parsed(list(parsed))
+
+    # Просимо лише ті, що ще не запитували або чий час повтору настав
+    to_request = parse_ledger.due(sorted(unparsed))
+    if to_request:
+        responses = await _run_pool(to_request, request_parse)
+        parse_ledger.record_attempts(
+            {match_id: response is not None for match_id, response in zip(to_request, responses)}
+        )
+        log.info("requested parse for %d of %d unparsed matches", len(to_request), len(unparsed))
+    else:
+        log.info("no matches needed parsing")
+    parse_ledger.prune()
 
     if send_message_callback:
         await send_message_callback(f"[Готово] Пропарсив вам матчі за {days} {get_accusative_case(days, day_cases)}.")
@@ -49,11 +78,12 @@ async def check_and_parse_matches(days, send_message_callback=None):
 async def run_loop(days=7, send_message_callback=None):
     while True:
         try:
-            await check_and_parse_matches(days, send_message_callback)
+            with priority(BACKFILL):
+                await check_and_parse_matches(days, send_message_callback)
         except Exception as e:
-            print(f"[Crash] Error during parse check: {e}")
+            log.exception("parse check failed: %r", e)
         await asyncio.sleep(60)
 
 if __name__ == "__main__":
-    print("[Run] Parser is starting...")
+    log.info("parser is starting")
     asyncio.run(run_loop())
@@ -1,32 +1,35 @@
-import requests
 import datetime
-import os
 from flask.cli import load_dotenv
 from dateutil.parser import isoparse
 from core import player_win, get_match_end_time, names, GAME_MODES
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from dataclasses import dataclass, field
 from typing import List, Optional, Union
 from collections import Counter
 import random
-import httpx
+import opendota_client
+import stratz_client
+from solo_cache import solo_cache, MISSING
+from match_table import MatchTable
+from match_store import match_store
+from logs import get_logger, span
 
 load_dotenv()
 
-GRAPHQL_URL = "https://api.stratz.com/graphql"
-OD_API_URL = "https://api.opendota.com/api/matches/"
-STRATZ_TOKEN = os.getenv("STRATZ_API_TOKEN")
-QUERY_TEMPLATE = """
-query {
-  match(id: MATCH_ID_PLACEHOLDER) {
-    players {
-      steamAccountId
-      partyId
-    }
-  }
-}"""
+log = get_logger("reports")
 
-@dataclass
+# Поля /players/{id}/matches, з яких будуються Match (player_win, get_match_end_time)
+MATCH_LIST_FIELDS = ("match_id", "start_time", "duration", "player_slot", "radiant_win",
+                     "game_mode")
+
+# Тиждень у звітах — сьогодні + 6 попередніх діб (UTC): rollup рахується по днях,
+# тож і шлях по сирих матчах бере ті самі цілі дні
+WEEK_DAYS = 7
+
+# steam_id для rollup-рядків, що рахують матчі загалом (реального акаунта з id 0 нема)
+ALL_MATCHES_ID = 0
+
+@dataclass(slots=True)
 class Match:
     match_id: int
     player_ids: List[int]
@@ -42,21 +45,28 @@ class Match:
             self.endtime = isoparse(self.endtime)
 
     @staticmethod
-    async def get_recent_matches(steam_id: int, days: int = 1, limit: int = 10, offset: int = 0, after_match_id: int | None = None) -> list:
-        """Fetch recent matches for a given player (steam_id) in the last N days."""
-        url = f"https://api.opendota.com/api/players/{steam_id}/matches"
-
-        params = {"date": days,
-                  "limit": limit,
-                  "offset": offset,
-                  "after_match_id": after_match_id}
-        response = requests.get(url, params=params)
-
-        if response.status_code != 200:
-            print(f"Failed to fetch matches for {steam_id}")
-            return []
-
-        return response.json()
+    async def get_recent_matches(steam_id: int, days: int = 1, limit: int = 10, offset: int = 0,
+                                 after_match_id: int | None = None,
+                                 project=MATCH_LIST_FIELDS, strict: bool = False) -> list | None:
+        """
+        Fetch recent matches for a given player (steam_id) in the last N days.
+        project — the fields the caller reads; OpenDota sends only these (None = all).
+        strict — return None instead of [] when the request failed.
+        """
+        matches = await opendota_client.get_player_matches(
+            steam_id,
+            project=project,
+            date=days,
+            limit=limit,
+            offset=offset,
+            after_match_id=after_match_id,
+        )
+
+        if matches is None:
+            log.warning("failed to fetch matches for %s", steam_id)
+            return None if strict else []
+
+        return matches
 
     @staticmethod
     async def create_new_matches_from_recent(steam_id: int, known_ids: list) -> list:
@@ -88,12 +98,6 @@ class Match:
 
         return new_matches
 
-async def get_last_week_matches():
-    import db
-    matches = await db.get_logged_match_objects()
-    one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-    return [m for m in matches if m.endtime > one_week_ago]
-
 def get_player_counters(matches: list) -> tuple[Counter, Counter, Counter, Counter]:
     games_played = Counter()
     wins = Counter()
@@ -114,6 +118,115 @@ def get_player_counters(matches: list) -> tuple[Counter, Counter, Counter, Count
 
     return games_played, wins, losses, solo
 
+def compute_daily_rollups(matches) -> list[dict]:
+    """
+    Aggregates matches into rollup rows keyed by (steam_id, day, match_mode).
+    Rows with steam_id ALL_MATCHES_ID count each match once, for team totals.
+    """
+    rollups = {}
+    for m in matches:
+        if m.endtime is None:
+            continue
+        day = m.endtime.astimezone(timezone.utc).date().isoformat()
+        mode = m.match_mode or 0
+        duration = m.duration or 0
+        for steam_id in (ALL_MATCHES_ID, *m.player_ids):
+            row = rollups.get((steam_id, day, mode))
+            if row is None:
+                row = rollups[(steam_id, day, mode)] = {
+                    "steam_id": steam_id,
+                    "day": day,
+                    "match_mode": mode,
+                    "games": 0,
+                    "wins": 0,
+                    "solo_games": 0,
+                    "total_duration": 0,
+                    "max_duration": -1,
+                    "max_duration_match_id": None,
+                }
+            row["games"] += 1
+            row["wins"] += bool(m.win_status)
+            row["solo_games"] += bool(m.solo_status)
+            row["total_duration"] += duration
+            if duration > row["max_duration"]:
+                row["max_duration"] = duration
+                row["max_duration_match_id"] = m.match_id
+    return list(rollups.values())
+
+@dataclass
+class PeriodTotals:
+    """Report aggregates, built either from raw matches or from daily rollup rows."""
+    total: int = 0
+    wins: int = 0
+    games_played: Counter = field(default_factory=Counter)
+    wins_by_player: Counter = field(default_factory=Counter)
+    losses_by_player: Counter = field(default_factory=Counter)
+    solo_games: Counter = field(default_factory=Counter)
+    mode_counts: Counter = field(default_factory=Counter)
+    longest_match_id: Optional[int] = None
+    longest_duration: int = -1
+
+    @classmethod
+    def from_matches(cls, matches) -> "PeriodTotals":
+        totals = cls(total=len(matches), wins=sum(bool(m.win_status) for m in matches))
+        (totals.games_played, totals.wins_by_player,
+         totals.losses_by_player, totals.solo_games) = get_player_counters(matches)
+        totals.mode_counts = Counter(m.match_mode or 0 for m in matches)
+        longest = max(matches, key=lambda m: m.duration or 0, default=None)
+        if longest is not None:
+            totals.longest_match_id = longest.match_id
+            totals.longest_duration = longest.duration or 0
+        return totals
+
+    @classmethod
+    def from_table(cls, table: MatchTable, rows: range) -> "PeriodTotals":
+        """Same aggregates as from_matches, read from the table columns without records."""
+        win, solo, player_ids = table.win, table.solo, table.player_ids
+        totals = cls(total=len(rows), wins=sum(win[rows.start:rows.stop]))
+        games_played, wins = totals.games_played, totals.wins_by_player
+        losses, solo_games = totals.losses_by_player, totals.solo_games
+        for row in rows:
+            won = win[row]
+            is_solo = solo[row] > 0
+            for pid in player_ids[row]:
+                games_played[pid] += 1
+                if won:
+                    wins[pid] += 1
+                else:
+                    losses[pid] += 1
+                if is_solo:
+                    solo_games[pid] += 1
+        totals.mode_counts = Counter(table.mode[rows.start:rows.stop])
+        longest = table.longest(rows)
+        if longest is not None:
+            totals.longest_match_id = longest.match_id
+            totals.longest_duration = longest.duration
+        return totals
+
+    @classmethod
+    def from_rollups(cls, rows: list[dict]) -> "PeriodTotals":
+        totals = cls()
+        for r in rows:
+            games, wins = r["games"], r["wins"]
+            if r["steam_id"] == ALL_MATCHES_ID:
+                totals.total += games
+                totals.wins += wins
+                totals.mode_counts[r["match_mode"]] += games
+                if r["max_duration"] > totals.longest_duration:
+                    totals.longest_duration = r["max_duration"]
+                    totals.longest_match_id = r["max_duration_match_id"]
+                continue
+            # Як і get_player_counters: у лічильниках лише ненульові значення
+            pid = r["steam_id"]
+            totals.games_played[pid] += games
+            if wins:
+                totals.wins_by_player[pid] += wins
+            if games - wins:
+                totals.losses_by_player[pid] += games - wins
+            if r["solo_games"]:
+                totals.solo_games[pid] += r["solo_games"]
+        return totals
+
 def get_longest_match(matches: list, players: list, platform: str) -> str:
     if not matches:
         return "Немає зіграних ігор для аналізу тривалості."
@@ -142,18 +255,34 @@ def get_longest_match(matches: list, players: list, platform: str) -> str:
         f"🆔 Match ID: {longest.match_id}"
     )
 
-def generate_weekly_summary(matches: list, players: list, platform: str) -> str:
-    one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-    recent_matches = [m for m in matches if m.endtime and m.endtime > one_week_ago]
-
-    if not recent_matches:
-        return "📉 За останній тиждень ігор не знайдено."
+def week_start_day(now: datetime | None = None) -> date:
+    """First UTC day of the report week (today plus the WEEK_DAYS - 1 days before it)."""
+    now = now or datetime.now(timezone.utc)
+    return (now.astimezone(timezone.utc) - timedelta(days=WEEK_DAYS - 1)).date()
 
-    total = len(recent_matches)
-    wins = sum(m.win_status for m in recent_matches)
+def generate_weekly_summary(matches: list, players: list, platform: str) -> str:
+    """Weekly report from raw matches, over the same UTC days as the rollup path."""
+    since_day = week_start_day()
+    table = MatchTable.of(matches)
+    rows = table.rows(since=datetime.combine(since_day, datetime.min.time(), tzinfo=timezone.utc))
+
+    longest = table.longest(rows)
+    totals = PeriodTotals.from_table(table, rows)
+    return format_weekly_summary(totals, longest, players, platform, since_day)
+
+def format_weekly_summary(totals: PeriodTotals, longest, players: list, platform: str,
+                          since_day: date) -> str:
+    if not totals.total:
+        return f"📉 З {since_day:%d.%m} (UTC) ігор не знайдено."
+
+    total = totals.total
+    wins = totals.wins
     winrate = round((wins / total) * 100, 1)
 
-    games_played, wins_by_player, losses_by_player, solo_games = get_player_counters(recent_matches)
+    games_played = totals.games_played
+    wins_by_player = totals.wins_by_player
+    losses_by_player = totals.losses_by_player
+    solo_games = totals.solo_games
 
     def get_name(pid):
         for p in players:
@@ -195,7 +324,7 @@ def generate_weekly_summary(matches: list, players: list, platform: str) -> str:
     top_solo = get_name(top_solo_id)
 
     # Longest match info
-    longest_match_str = get_longest_match(recent_matches, players, platform)
+    longest_match_str = get_longest_match([longest] if longest else [], players, platform)
 
     # Prepare the player stats list
     player_stats_list = '\n'.join(
@@ -205,7 +334,7 @@ def generate_weekly_summary(matches: list, players: list, platform: str) -> str:
     )
 
     return (
-        f"🗓️ *Тижневий звіт:*\n"
+        f"🗓️ *Тижневий звіт (з {since_day:%d.%m}, UTC):*\n"
         f"🎮 Ігор зіграно: *{total}*\n"
         f"🏆 Виграно: *{wins}* ({winrate}%)\n"
         f"👑 Найбільше ігор: {random.choice(names)} {top_played} ({top_played_count})\n"
@@ -221,42 +350,50 @@ def generate_weekly_summary(matches: list, players: list, platform: str) -> str:
 async def generate_weekly_report(channel, platform: str) -> str:
     import db
     players = await db.get_channel_players(channel)
-    matches = await db.get_logged_match_objects()
-    return generate_weekly_summary(matches, players, platform)
+    since_day = week_start_day()
+    rows = []
+    if await db.ensure_rollups():
+        with span(log, "weekly_rollups", channel=channel) as info:
+            rows = await db.get_rollups(since_day)
+            info["rows"] = len(rows)
+    if not rows:
+        # Rollup порожній або ще не покриває matchlog (бекфіл не вдався) — рахуємо по сирих матчах
+        index = await match_store.index()
+        return generate_weekly_summary(index, players, platform)
+    totals = PeriodTotals.from_rollups(rows)
+    longest = await db.get_match_by_id(totals.longest_match_id)
+    return format_weekly_summary(totals, longest, players, platform, since_day)
 
 async def generate_all_time_report(channel, platform: str) -> str:
     import db
-    matches = await db.get_logged_match_objects()
     players = await db.get_channel_players(channel)
+    rows = []
+    if await db.ensure_rollups():
+        with span(log, "all_time_rollups", channel=channel, players=len(players)) as info:
+            rows = await db.get_rollups()
+            info["rows"] = len(rows)
+    if rows:
+        totals = PeriodTotals.from_rollups(rows)
+        longest_match = await db.get_match_by_id(totals.longest_match_id)
+    else:
+        # Rollup порожній чи неповний — старий шлях по збережених матчах
+        matches = await match_store.snapshot()
+        totals = PeriodTotals.from_matches(matches)
+        longest_match = max(matches, key=lambda m: m.duration or 0, default=None)
+    return format_all_time_report(totals, longest_match, players, platform)
+
+def format_all_time_report(totals: PeriodTotals, longest_match, players: list,
+                           platform: str) -> str:
     player_map = {p.steam_id: p for p in players}
 
-    print("=== DEBUG PLAYERS ===")
-    for p in players:
-        print(p.steam_id, p.name)
-    print("=== DEBUG MATCH PLAYER IDS ===")
-    for m in matches[:5]:
-        print(m.match_id, m.player_ids, [type(pid) for pid in m.player_ids])
-
     # 1. Total matches and game mode breakdown
-    total_matches = len(matches)
-    mode_counts = {}
-    for match in matches:
-        mode = match.match_mode or "Unknown"
-        mode_counts[mode] = mode_counts.get(mode, 0) + 1
+    total_matches = totals.total
+    mode_counts = totals.mode_counts
 
     # 2. Player stats
-    from collections import defaultdict
-    games_played = defaultdict(int)
-    wins = defaultdict(int)
-    solo_games = defaultdict(int)
-
-    for match in matches:
-        for pid in match.player_ids:
-            games_played[pid] += 1
-            if match.solo_status:
-                solo_games[pid] += 1
-            if match.win_status:
-                wins[pid] += 1
+    games_played = totals.games_played
+    wins = totals.wins_by_player
+    solo_games = totals.solo_games
 
     stats = []
     for pid, count in sorted(games_played.items(), key=lambda x: x[1], reverse=True):
@@ -266,20 +403,18 @@ async def generate_all_time_report(channel, platform: str) -> str:
         solos = solo_games.get(pid, 0)
         stats.append(f"{name}: {count} ігор, {winrate:.1f}% WR, {solos} соло")
 
-    # 3. Longest match
-    longest_match = max(matches, key=lambda m: m.duration, default=None)
-
     # Final report
     msg = "📊 УСІ ЧАСИ 📊\n"
     msg += f"🔢 Всього матчів: {total_matches}\n"
 
     msg += "\n📚 Режими гри:\n"
-    for mode, count in mode_counts.items():
+    for mode, count in mode_counts.most_common():
         msg += f"• {GAME_MODES.get(mode)}: {count}\n"
 
     msg += "\n🏅 Статистика гравців:\n"
     msg += "\n".join(stats)
 
+    # 3. Longest match
     if longest_match:
         mins = longest_match.duration // 60
         secs = longest_match.duration % 60
@@ -297,7 +432,6 @@ async def generate_all_time_report(channel, platform: str) -> str:
                 tracked_players.append(nickname)
 
         msg += "\n\n🐌 Найдовша гра:\n"
-        msg += f""
         msg += f"⏱ Тривалість: {duration_str}\n"
         msg += f"🎮 Режим: {mode_str}\n"
         msg += f"{outcome_str}\n"
@@ -307,47 +441,40 @@ async def generate_all_time_report(channel, platform: str) -> str:
     return msg
 
 async def fetch_match_from_stratz(match_id: int) -> dict | None:
-    query = QUERY_TEMPLATE.replace("MATCH_ID_PLACEHOLDER", str(match_id))
+    # Окремі запити склеюються резолвером у батчі по STRATZ_BATCH_SIZE матчів
+    return await stratz_client.fetch_match(match_id)
 
-    headers = {
-        "Authorization": f"Bearer {STRATZ_TOKEN}",
-        "Content-Type": "application/json",
-        "User-Agent": "STRATZ_API"
-    }
-
-    payload = {"query": query}
-
-    # Клієнт із більшим таймаутом
-    timeout = httpx.Timeout(20.0)  # 20 секунд
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        for attempt in range(3):  # до 3 спроб
-            try:
-                response = await client.post(GRAPHQL_URL, json=payload, headers=headers)
-                if response.status_code == 200:
-                    return response.json().get("data", {}).get("match")
-                else:
-                    print(f"[STRATZ] Error {response.status_code}: {response.text}")
-                    return None
-            except httpx.ReadTimeout:
-                print(f"[STRATZ] Timeout fetching {match_id}, attempt {attempt+1}/3")
-                if attempt < 2:
-                    await asyncio.sleep(2)  # ретрай з паузою
-                else:
-                    return None
-
-async def is_player_solo_in_match(match_id, steam_id: int) -> bool | None:
+async def is_player_solo_in_match(match_id, steam_id: int,
+                                  not_found_ttl: float | None = None) -> bool | None:
     """
     Returns True if the player was solo (no partyId),
     False if in a party,
     None if player not found or data is malformed.
+    Results are cached per (match_id, steam_id); only unseen matches hit STRATZ.
+    not_found_ttl — retry a cached "not found" sooner than SOLO_NOT_FOUND_TTL.
     """
-    match_data = await fetch_match_from_stratz(match_id)
-    if not match_data or "players" not in match_data:
-        print(f"[⚠️] Could not retrieve players for match {match_id}")
+    cached = solo_cache.get(match_id, steam_id, not_found_ttl)
+    if cached is not MISSING:
+        return cached
+
+    try:
+        match_data = await fetch_match_from_stratz(match_id)
+    except stratz_client.StratzUnavailable:
+        # Збій мережі не кешуємо — спробуємо ще раз наступного циклу
+        log.warning("STRATZ unavailable for match %s", match_id)
         return None
 
-    for player in match_data["players"]:
-        if player.get("steamAccountId") == steam_id:
-            return player.get("partyId") is None
+    if not match_data or "players" not in match_data:
+        log.warning("could not retrieve players for match %s", match_id)
+        solo_cache.put(match_id, steam_id, None)
+        return None
 
-    return None  # Player not found in match
\ No newline at end of file
+    # Одна відповідь STRATZ покриває всіх гравців матчу — кешуємо всіх одразу
+    results = {
+        p["steamAccountId"]: p.get("partyId") is None
+        for p in match_data["players"]
+        if p.get("steamAccountId")
+    }
+    results.setdefault(steam_id, None)  # Player not found in match
+    solo_cache.put_many(match_id, results)
+    return results[steam_id]
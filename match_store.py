@@ -0,0 +1,101 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+from match_table import MatchRecord, MatchTable
+from metrics import cache_lookup
+
+# Скільки найсвіжіших матчів тримаємо (так само, як get_logged_matches)
+STORE_LIMIT = int(os.getenv("MATCH_STORE_LIMIT", "2000"))
+# Повторні звіти в межах цього вікна не роблять навіть дельта-запит
+MIN_SYNC_INTERVAL = float(os.getenv("MATCH_STORE_MIN_SYNC", "5"))
+# У matchlog нема мітки оновлення, тож зміни старих рядків іншими процесами
+# підхоплюємо повним перезавантаженням раз на FULL_RELOAD_INTERVAL секунд
+FULL_RELOAD_INTERVAL = float(os.getenv("MATCH_STORE_FULL_RELOAD", str(6 * 3600)))
+
+
+class MatchStore:
+    """
+    Long-lived in-process copy of the newest matchlog rows.
+    Loads once, then pulls only rows with a newer endtime; writes made by this
+    process are applied directly via apply(). Matches are kept as MatchRecord
+    tuples and indexed as a MatchTable.
+    """
+
+    def __init__(self, limit: int = STORE_LIMIT):
+        self.limit = limit
+        self._matches: dict[int, MatchRecord] = {}
+        self._snapshot: tuple | None = None
+        self._index: MatchTable | None = None
+        self._newest_ts: int | None = None
+        self._loaded_at = 0.0
+        self._synced_at = 0.0
+        self._lock = asyncio.Lock()
+        # Записи apply(), що прийшли, поки sync чекав на сховище: його вибірка могла
+        # бути зроблена до них, тож після злиття накладаємо їх ще раз
+        self._pending: list | None = None
+
+    async def sync(self, force: bool = False):
+        import db
+
+        async with self._lock:
+            now = time.monotonic()
+            fresh = not force and now - self._synced_at < MIN_SYNC_INTERVAL
+            cache_lookup("match_store", fresh)
+            if fresh:
+                return
+            self._pending = []
+            try:
+                if force or not self._loaded_at or now - self._loaded_at >= FULL_RELOAD_INTERVAL:
+                    matches = await db.get_logged_match_records()
+                    self._matches = {}
+                    self._newest_ts = None
+                    self._loaded_at = now
+                else:
+                    since = (datetime.fromtimestamp(self._newest_ts, timezone.utc)
+                             if self._newest_ts is not None else None)
+                    matches = await db.get_match_records_since(since)
+                self._merge(matches + self._pending)
+            finally:
+                self._pending = None
+            self._synced_at = now
+
+    def apply(self, matches: list):
+        """Write-through for matches this process has just added or updated."""
+        records = [MatchRecord.from_match(m) for m in matches]
+        if self._pending is not None:
+            self._pending.extend(records)
+        if self._loaded_at:
+            self._merge(records)
+
+    def _merge(self, matches: list):
+        if not matches and self._snapshot is not None:
+            return
+        for m in matches:
+            self._matches[m.match_id] = m
+            if m.end_ts is not None and (self._newest_ts is None or m.end_ts > self._newest_ts):
+                self._newest_ts = m.end_ts
+        ordered = sorted(
+            self._matches.values(),
+            key=lambda m: (m.end_ts is not None, m.end_ts or 0),
+            reverse=True,
+        )[:self.limit]
+        self._matches = {m.match_id: m for m in ordered}
+        self._snapshot = tuple(ordered)
+        self._index = None
+
+    async def snapshot(self) -> tuple:
+        """Read-only view of stored matches, newest first (same order as matchlog)."""
+        await self.sync()
+        return self._snapshot or ()
+
+    async def index(self) -> MatchTable:
+        """Columnar table over the current snapshot, rebuilt only when it changes."""
+        snapshot = await self.snapshot()
+        if self._index is None:
+            self._index = MatchTable(snapshot)
+        return self._index
+
+
+match_store = MatchStore()
@@ -0,0 +1,133 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+
+class MatchRecord(NamedTuple):
+    """
+    Read-only match for reports: a plain tuple with player ids as a tuple and
+    endtime as epoch seconds. `endtime` is still available as a UTC datetime.
+    """
+    match_id: int
+    player_ids: tuple
+    win_status: bool
+    end_ts: Optional[int]
+    duration: int
+    solo_status: Optional[bool] = None
+    match_mode: int = 0
+
+    @property
+    def endtime(self) -> datetime | None:
+        if self.end_ts is None:
+            return None
+        return datetime.fromtimestamp(self.end_ts, timezone.utc)
+
+    @classmethod
+    def from_match(cls, m) -> "MatchRecord":
+        """Converts a Match (or anything with the same attributes)."""
+        if isinstance(m, cls):
+            return m
+        return cls(
+            match_id=m.match_id,
+            player_ids=tuple(m.player_ids),
+            win_status=m.win_status,
+            end_ts=int(m.endtime.timestamp()) if m.endtime is not None else None,
+            duration=m.duration,
+            solo_status=m.solo_status,
+            match_mode=m.match_mode,
+        )
+
+
+def _ts(moment: datetime | None) -> float | None:
+    return moment.timestamp() if moment is not None else None
+
+
+class MatchTable:
+    """
+    Matches as parallel arrays sorted by endtime (row i is the i-th oldest),
+    plus steam_id -> that player's row numbers, so "last hour / day / week"
+    lookups are bisect ranges and aggregates read the columns directly.
+    Matches without endtime can't fall into any window and are skipped.
+    """
+
+    def __init__(self, records):
+        timed = sorted((r for r in records if r.end_ts is not None), key=lambda r: r.end_ts)
+        self.match_id = array("q", [r.match_id for r in timed])
+        self.end_ts = array("q", [r.end_ts for r in timed])
+        self.duration = array("i", [r.duration or 0 for r in timed])
+        self.mode = array("h", [r.match_mode or 0 for r in timed])
+        self.win = array("b", [bool(r.win_status) for r in timed])
+        # -1 — соло-статус невідомий (None)
+        self.solo = array("b", [-1 if r.solo_status is None else bool(r.solo_status)
+                                for r in timed])
+        self.player_ids = [r.player_ids for r in timed]
+
+        by_player: dict[int, list[int]] = {}
+        for row, pids in enumerate(self.player_ids):
+            for pid in pids:
+                by_player.setdefault(pid, []).append(row)
+        end_ts = self.end_ts
+        # steam_id -> (endtime гравцевих матчів, номери рядків), обидва за часом
+        self._by_player = {
+            pid: (array("q", [end_ts[row] for row in rows]), array("i", rows))
+            for pid, rows in by_player.items()
+        }
+
+    @classmethod
+    def of(cls, matches) -> "MatchTable":
+        """Accepts either a ready table or a list of Match / MatchRecord."""
+        if isinstance(matches, cls):
+            return matches
+        return cls(MatchRecord.from_match(m) for m in matches)
+
+    def __len__(self):
+        return len(self.match_id)
+
+    def record(self, row: int) -> MatchRecord:
+        solo = self.solo[row]
+        return MatchRecord(
+            match_id=self.match_id[row],
+            player_ids=self.player_ids[row],
+            win_status=bool(self.win[row]),
+            end_ts=self.end_ts[row],
+            duration=self.duration[row],
+            solo_status=None if solo < 0 else bool(solo),
+            match_mode=self.mode[row],
+        )
+
+    @staticmethod
+    def _bounds(times, since: datetime | None, until: datetime | None) -> tuple[int, int]:
+        lo = bisect_left(times, _ts(since)) if since is not None else 0
+        hi = bisect_right(times, _ts(until)) if until is not None else len(times)
+        return lo, hi
+
+    def rows(self, since: datetime | None = None, until: datetime | None = None) -> range:
+        """Row numbers of matches with since <= endtime <= until, oldest first."""
+        return range(*self._bounds(self.end_ts, since, until))
+
+    def window(self, since: datetime | None = None, until: datetime | None = None) -> list:
+        """All matches with since <= endtime <= until, oldest first."""
+        return [self.record(row) for row in self.rows(since, until)]
+
+    def player_rows(self, steam_id: int, since: datetime | None = None,
+                    until: datetime | None = None):
+        """Row numbers of one player's matches with since <= endtime <= until, oldest first."""
+        entry = self._by_player.get(steam_id)
+        if entry is None:
+            return array("i")
+        lo, hi = self._bounds(entry[0], since, until)
+        return entry[1][lo:hi]
+
+    def player_matches(self, steam_id: int, since: datetime | None = None,
+                       until: datetime | None = None) -> list:
+        """One player's matches with since <= endtime <= until, oldest first."""
+        return [self.record(row) for row in self.player_rows(steam_id, since, until)]
+
+    def longest(self, rows: range | None = None) -> MatchRecord | None:
+        """Longest match among rows (the oldest one on a tie), None if there are none."""
+        rows = range(len(self)) if rows is None else rows
+        if not rows:
+            return None
+        duration = self.duration
+        return self.record(max(rows, key=duration.__getitem__))
@@ -0,0 +1,215 @@
+"""
+In-process metrics rendered in the Prometheus text format (served at /metrics).
+Hand-rolled to avoid a client dependency; only what the bot needs.
+"""
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+# Межі бакетів латентності, с: від швидкого кешу до повільного STRATZ
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+JOB_BUCKETS = (0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+_registry: list["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values: dict[tuple, object] = {}
+        self._lock = Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key: tuple, value) -> list[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)}"
+                         f" {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# --- метрики бота ---
+
+upstream_latency = Histogram(
+    "shiftbot_upstream_request_seconds", "Latency of calls to external services.",
+    ("upstream",))
+upstream_errors = Counter(
+    "shiftbot_upstream_errors_total", "Failed calls to external services by reason.",
+    ("upstream", "reason"))
+quota_remaining = Gauge(
+    "shiftbot_upstream_quota_remaining", "Requests left in the upstream's rate-limit window.",
+    ("upstream", "window"))
+rate_limit_wait = Histogram(
+    "shiftbot_rate_limit_wait_seconds", "Time spent waiting for a rate-limiter token.",
+    ("upstream", "priority"))
+
+job_duration = Histogram(
+    "shiftbot_job_duration_seconds", "Duration of scheduled jobs.", ("job",), JOB_BUCKETS)
+job_last_success = Gauge(
+    "shiftbot_job_last_success_timestamp_seconds", "Unix time of the last successful run.",
+    ("job",))
+job_interval = Gauge(
+    "shiftbot_job_interval_seconds", "Configured schedule interval of the job.", ("job",))
+job_failures = Counter("shiftbot_job_failures_total", "Job runs that raised.", ("job",))
+
+matches_collected = Counter(
+    "shiftbot_matches_collected_total", "Matches written by the collector.", ("kind",))
+last_cycle_matches = Gauge(
+    "shiftbot_collect_last_cycle_matches", "Matches written by the latest collect cycle.",
+    ("kind",))
+
+cache_requests = Counter(
+    "shiftbot_cache_requests_total", "Cache lookups by result.", ("cache", "result"))
+
+
+class _CacheHitRatio(Gauge):
+    """Hit ratio per cache, computed from cache_requests at render time."""
+
+    def render(self) -> list[str]:
+        with cache_requests._lock:
+            totals: dict[str, list[float]] = {}
+            for (cache, result), count in cache_requests._values.items():
+                entry = totals.setdefault(cache, [0, 0])
+                entry[0 if result == "hit" else 1] += count
+        with self._lock:
+            self._values = {(cache,): hits / (hits + misses)
+                            for cache, (hits, misses) in totals.items() if hits + misses}
+        return super().render()
+
+
+cache_hit_ratio = _CacheHitRatio(
+    "shiftbot_cache_hit_ratio", "Share of cache lookups served from cache.", ("cache",))
+
+
+def cache_lookup(cache: str, hit: bool):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+@contextmanager
+def observe_upstream(upstream: str):
+    """Times one external call; an exception counts as an error with its type as reason."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        upstream_errors.inc(upstream=upstream, reason=type(e).__name__)
+        raise
+    finally:
+        upstream_latency.observe(time.perf_counter() - started, upstream=upstream)
+
+
+def upstream_error(upstream: str, reason):
+    """Counts a failed call that did not raise, e.g. a non-200 status."""
+    upstream_errors.inc(upstream=upstream, reason=str(reason))
+
+
+@contextmanager
+def track_job(job: str, interval: float | None = None):
+    """Records duration, failures and last success time of a scheduled job run."""
+    if interval:
+        job_interval.set(interval, job=job)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        job_failures.inc(job=job)
+        raise
+    else:
+        job_last_success.set(time.time(), job=job)
+    finally:
+        job_duration.observe(time.perf_counter() - started, job=job)
+
+
+def record_collect(new: int, updated: int):
+    matches_collected.inc(new, kind="new")
+    matches_collected.inc(updated, kind="updated")
+    last_cycle_matches.set(new, kind="new")
+    last_cycle_matches.set(updated, kind="updated")
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
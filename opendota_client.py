@@ -0,0 +1,185 @@
+import asyncio
+import os
+import re
+import time
+from typing import Any
+
+import aiohttp
+from dotenv import load_dotenv
+
+from http_cache import CacheEntry, ResponseCache
+from logs import get_logger
+from metrics import cache_lookup, observe_upstream, upstream_error
+from rate_limiter import get_limiter
+
+load_dotenv()
+
+log = get_logger("opendota")
+
+# Можна перенаправити на локальний стенд (benchmarks/fake_services.py)
+OD_BASE_URL = os.getenv("OPENDOTA_BASE_URL", "https://api.opendota.com/api").rstrip("/")
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=20, connect=5)
+
+# Один пул з'єднань на весь процес: keep-alive замість нового TLS на кожен запит
+POOL_SIZE = 20
+KEEPALIVE_TIMEOUT = 60
+# Скільки разів повторюємо запит після 429
+RATE_LIMIT_RETRIES = 1
+
+# Скільки секунд відповідь вважається свіжою; інші ендпоінти не кешуються
+PLAYER_TTL = float(os.getenv("OPENDOTA_PLAYER_TTL", "600"))
+PLAYER_MATCHES_TTL = float(os.getenv("OPENDOTA_PLAYER_MATCHES_TTL", "60"))
+CACHE_TTLS = (
+    (re.compile(r"/players/\d+$"), PLAYER_TTL),
+    (re.compile(r"/players/\d+/matches$"), PLAYER_MATCHES_TTL),
+)
+# Дисковий рівень кешу в локальній БД стану — переживає перезапуск бота
+CACHE_DISK = os.getenv("OPENDOTA_CACHE_DISK", "0") == "1"
+
+_cache = ResponseCache("opendota", disk=CACHE_DISK)
+_session: aiohttp.ClientSession | None = None
+_session_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Returns the shared OpenDota session, creating it for the running event loop if needed."""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_SIZE,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+        _session_loop = loop
+    return _session
+
+
+async def close_session():
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+def query_pairs(params: dict) -> list[tuple[str, str]]:
+    """Query string pairs; list values repeat the key (project=a&project=b), None is dropped."""
+    pairs = []
+    for key, value in params.items():
+        if value is None:
+            continue
+        for item in value if isinstance(value, (list, tuple)) else (value,):
+            pairs.append((key, str(item)))
+    return pairs
+
+
+def _request_kwargs(params: dict | None, timeout: float | None) -> dict:
+    kwargs = {}
+    # aiohttp не приймає None у query, requests їх просто пропускав
+    if params:
+        kwargs["params"] = query_pairs(params)
+    # timeout=None в aiohttp вимикає таймаут зовсім, тому передаємо лише явний
+    if timeout:
+        kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+    return kwargs
+
+
+async def _request(method: str, path: str, params: dict | None, timeout: float | None,
+                   headers: dict | None = None) -> tuple[int | None, Any, Any]:
+    """(status, parsed JSON for a 200, response headers); status is None on network errors."""
+    url = f"{OD_BASE_URL}{path}"
+    limiter = get_limiter("opendota")
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        await limiter.acquire()
+        try:
+            with observe_upstream("opendota"):
+                async with get_session().request(
+                    method, url, headers=headers, **_request_kwargs(params, timeout)
+                ) as resp:
+                    limiter.update(resp.headers, resp.status)
+                    if resp.status == 200:
+                        return 200, await resp.json(), resp.headers
+                    if resp.status == 304:
+                        return 304, None, resp.headers
+                    upstream_error("opendota", resp.status)
+                    log.warning("%s %s failed with status %s", method, path, resp.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.warning("%s %s failed: %r", method, path, e)
+            return None, None, {}
+        # 429: лімітер уже знає Retry-After, тож повтор просто дочекається токена
+        if resp.status != 429:
+            break
+    return resp.status, None, resp.headers
+
+
+def _ttl(path: str) -> float:
+    for pattern, ttl in CACHE_TTLS:
+        if pattern.match(path):
+            return ttl
+    return 0
+
+
+async def _fetch_cached(path: str, params: dict | None, timeout: float | None,
+                        key: str, stale: CacheEntry | None, ttl: float) -> Any:
+    headers = stale.validators() if stale is not None else None
+    status, data, resp_headers = await _request("GET", path, params, timeout, headers)
+    if status == 304 and stale is not None:
+        _cache.refresh(key, stale, time.time() + ttl)
+        return stale.body
+    if status != 200:
+        return None
+    _cache.put(key, CacheEntry(
+        data, time.time() + ttl, resp_headers.get("ETag"), resp_headers.get("Last-Modified"),
+    ))
+    return data
+
+
+async def get_json(path: str, params: dict | None = None, timeout: float | None = None) -> Any:
+    """
+    GET an OpenDota endpoint. Returns parsed JSON, or None on error / non-200 status.
+    Endpoints listed in CACHE_TTLS are served from the response cache while fresh,
+    revalidated with ETag/Last-Modified once stale; the result must not be modified.
+    """
+    ttl = _ttl(path)
+    if not ttl:
+        status, data, _ = await _request("GET", path, params, timeout)
+        return data if status == 200 else None
+
+    key = _cache.key(path, query_pairs(params) if params else None)
+    entry = _cache.get(key)
+    if entry is not None and entry.fresh():
+        cache_lookup("opendota", True)
+        return entry.body
+    # Хто приєднався до вже запущеного запиту, теж не ходить в OpenDota
+    cache_lookup("opendota", _cache.in_flight(key))
+    return await _cache.singleflight(
+        key, lambda: _fetch_cached(path, params, timeout, key, entry, ttl)
+    )
+
+
+async def post_json(path: str, timeout: float | None = None) -> Any:
+    """POST to an OpenDota endpoint. Returns parsed JSON, or None on error / non-200 status."""
+    status, data, _ = await _request("POST", path, None, timeout)
+    return data if status == 200 else None
+
+
+async def get_player(steam_id: int) -> dict | None:
+    """Returns the /players/{id} profile (rank_tier, profile.personaname, ...)."""
+    return await get_json(f"/players/{steam_id}")
+
+
+async def get_player_matches(steam_id: int, project=None, **params) -> list | None:
+    """
+    Returns the /players/{id}/matches list; extra kwargs go straight to the query string.
+    project — only these fields of each match are requested (OpenDota `project=`).
+    """
+    if project:
+        params["project"] = list(project)
+    return await get_json(f"/players/{steam_id}/matches", params=params)
+
+
+async def request_parse(match_id: int) -> dict | None:
+    """Asks OpenDota to parse a given match."""
+    return await post_json(f"/request/{match_id}")
@@ -0,0 +1,102 @@
+import os
+import time
+
+import local_store
+
+# Після успішного запиту OpenDota парсить матч кілька хвилин, тож перевіряємо не раніше
+RECHECK_AFTER = float(os.getenv("PARSE_RECHECK_AFTER", "1800"))
+# Після збою запиту — перша пауза; далі кожна спроба подвоює очікування
+RETRY_AFTER = float(os.getenv("PARSE_RETRY_AFTER", "120"))
+MAX_BACKOFF = float(os.getenv("PARSE_MAX_BACKOFF", str(24 * 3600)))
+MAX_ATTEMPTS = int(os.getenv("PARSE_MAX_ATTEMPTS", "6"))
+# Скільки тримаємо записи про матчі, що вже випали з вікна парсера
+RETENTION = float(os.getenv("PARSE_LEDGER_RETENTION", str(30 * 24 * 3600)))
+
+REQUESTED = "requested"
+FAILED = "failed"
+PARSED = "parsed"
+ABANDONED = "abandoned"
+
+_table_ready = False
+
+
+def _db():
+    global _table_ready
+    conn = local_store.get_connection()
+    if not _table_ready:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS parse_requests ("
+            " match_id INTEGER PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " next_retry_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        _table_ready = True
+    return conn
+
+
+def backoff(attempts: int, ok: bool) -> float:
+    """Seconds until the next attempt after `attempts` requests, the last one ok or not."""
+    base = RECHECK_AFTER if ok else RETRY_AFTER
+    return min(base * 2 ** max(attempts - 1, 0), MAX_BACKOFF)
+
+
+def due(match_ids: list[int], now: float | None = None) -> list[int]:
+    """Unparsed matches that were never requested or whose retry time has come."""
+    if not match_ids:
+        return []
+    now = time.time() if now is None else now
+    match_ids = list(dict.fromkeys(match_ids))
+    placeholders = ",".join("?" * len(match_ids))
+    waiting = {
+        row[0] for row in _db().execute(
+            "SELECT match_id FROM parse_requests"
+            f" WHERE match_id IN ({placeholders})"
+            " AND (status IN (?, ?) OR next_retry_at > ?)",
+            [*match_ids, PARSED, ABANDONED, now],
+        )
+    }
+    return [match_id for match_id in match_ids if match_id not in waiting]
+
+
+def record_attempts(results: dict[int, bool], now: float | None = None):
+    """Stores the outcome of parse requests (match_id -> accepted) and schedules rechecks."""
+    if not results:
+        return
+    now = time.time() if now is None else now
+    conn = _db()
+    placeholders = ",".join("?" * len(results))
+    attempts = dict(conn.execute(
+        f"SELECT match_id, attempts FROM parse_requests WHERE match_id IN ({placeholders})",
+        list(results),
+    ).fetchall())
+    rows = []
+    for match_id, ok in results.items():
+        n = attempts.get(match_id, 0) + 1
+        status = ABANDONED if n >= MAX_ATTEMPTS else REQUESTED if ok else FAILED
+        rows.append((match_id, status, n, now + backoff(n, ok), now))
+    conn.executemany(
+        "INSERT OR REPLACE INTO parse_requests"
+        " (match_id, status, attempts, next_retry_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def mark_parsed(match_ids: list[int], now: float | None = None):
+    """Closes ledger entries for matches OpenDota now reports as parsed."""
+    if not match_ids:
+        return
+    now = time.time() if now is None else now
+    placeholders = ",".join("?" * len(match_ids))
+    _db().execute(
+        f"UPDATE parse_requests SET status = ?, updated_at = ?"
+        f" WHERE match_id IN ({placeholders}) AND status != ?",
+        [PARSED, now, *match_ids, PARSED],
+    )
+
+
+def prune(now: float | None = None):
+    """Drops entries untouched for RETENTION seconds."""
+    now = time.time() if now is None else now
+    _db().execute("DELETE FROM parse_requests WHERE updated_at < ?", (now - RETENTION,))
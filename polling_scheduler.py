@@ -0,0 +1,80 @@
+import heapq
+import os
+import time
+from datetime import datetime, timezone
+
+# Гравець "в сесії", якщо остання катка закінчилась не раніше ACTIVE_WINDOW секунд тому
+ACTIVE_WINDOW = int(os.getenv("POLL_ACTIVE_WINDOW", str(2 * 3600)))
+ACTIVE_INTERVAL = int(os.getenv("POLL_ACTIVE_INTERVAL", str(5 * 60)))
+IDLE_INTERVAL = int(os.getenv("POLL_IDLE_INTERVAL", str(15 * 60)))
+MAX_INTERVAL = int(os.getenv("POLL_MAX_INTERVAL", str(6 * 3600)))
+# Як часто job перевіряє чергу
+TICK_INTERVAL = int(os.getenv("POLL_TICK_INTERVAL", "60"))
+
+
+class AdaptivePoller:
+    """
+    Priority queue of the next due player. Active players are polled every
+    ACTIVE_INTERVAL; idle ones back off exponentially from IDLE_INTERVAL up to
+    MAX_INTERVAL, and drop back to fast polling as soon as a new match shows up.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, int]] = []
+        self._due: dict[int, float] = {}
+        self._interval: dict[int, float] = {}
+        self._last_end: dict[int, datetime | None] = {}
+
+    def __contains__(self, steam_id: int) -> bool:
+        return steam_id in self._due
+
+    def sync_roster(self, steam_ids, now: float | None = None):
+        """Adds new players (due immediately) and forgets removed ones."""
+        now = time.time() if now is None else now
+        steam_ids = set(steam_ids)
+        for steam_id in steam_ids - self._due.keys():
+            self._push(steam_id, now)
+            self._last_end.setdefault(steam_id, None)
+        for steam_id in self._due.keys() - steam_ids:
+            # Запис у купі лишається, але pop_due його пропустить
+            del self._due[steam_id]
+            self._interval.pop(steam_id, None)
+            self._last_end.pop(steam_id, None)
+
+    def pop_due(self, now: float | None = None) -> list[int]:
+        """Removes and returns every player whose poll time has come."""
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            at, steam_id = heapq.heappop(self._heap)
+            if self._due.get(steam_id) == at:
+                due.append(steam_id)
+        return due
+
+    def reschedule(self, steam_id: int, last_match_end: datetime | None, now: float | None = None):
+        """Picks the next poll time from the player's latest known match end."""
+        now = time.time() if now is None else now
+        if steam_id not in self._due:
+            return
+        previous_end = self._last_end.get(steam_id)
+        self._last_end[steam_id] = last_match_end
+
+        idle_for = (
+            now - last_match_end.astimezone(timezone.utc).timestamp()
+            if last_match_end is not None else None
+        )
+        if idle_for is not None and idle_for <= ACTIVE_WINDOW:
+            interval = ACTIVE_INTERVAL
+        elif last_match_end != previous_end:
+            interval = IDLE_INTERVAL
+        else:
+            interval = min(max(self._interval.get(steam_id, 0) * 2, IDLE_INTERVAL), MAX_INTERVAL)
+        self._interval[steam_id] = interval
+        self._push(steam_id, now + interval)
+
+    def next_due(self) -> float | None:
+        return min(self._due.values(), default=None)
+
+    def _push(self, steam_id: int, at: float):
+        self._due[steam_id] = at
+        heapq.heappush(self._heap, (at, steam_id))
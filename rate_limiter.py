@@ -0,0 +1,198 @@
+"""
+Process-wide rate limiting for OpenDota and STRATZ.
+
+Every request takes a token from its upstream's bucket. Waiters are served by
+priority class (interactive commands and loss alerts first, backfills and parse
+requests last), and lower classes may not spend the reserved end of the daily
+quota. Remaining quota is taken from the rate-limit response headers when
+the upstream sends them.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from metrics import quota_remaining, rate_limit_wait
+
+INTERACTIVE = 0
+SCHEDULED = 1
+BACKFILL = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", SCHEDULED: "scheduled", BACKFILL: "backfill"}
+
+# Частка денної квоти, яку клас не може з'їсти: бекфіл лишає запас для звітів і сповіщень
+DAILY_RESERVE = {INTERACTIVE: 0.0, SCHEDULED: 0.05, BACKFILL: 0.2}
+# Скільки запитів можна зробити підряд, не чекаючи поповнення
+BURST_SHARE = 0.25
+DEFAULT_RETRY_AFTER = 60
+
+LIMITS = {
+    # upstream -> (запитів на хвилину, на добу; 0 — невідомо)
+    "opendota": (int(os.getenv("OPENDOTA_RATE_PER_MINUTE", "60")),
+                 int(os.getenv("OPENDOTA_DAILY_LIMIT", "2000"))),
+    "stratz": (int(os.getenv("STRATZ_RATE_PER_MINUTE", "250")),
+               int(os.getenv("STRATZ_DAILY_LIMIT", "10000"))),
+}
+QUOTA_HEADERS = {
+    "opendota": {
+        "X-Rate-Limit-Remaining-Minute": "minute",
+        "X-Rate-Limit-Remaining-Day": "day",
+    },
+    "stratz": {
+        "X-RateLimit-Remaining-Second": "second",
+        "X-RateLimit-Remaining-Minute": "minute",
+        "X-RateLimit-Remaining-Hour": "hour",
+        "X-RateLimit-Remaining-Day": "day",
+    },
+}
+WINDOW_SECONDS = {"second": 1, "minute": 60, "hour": 3600}
+
+_priority = contextvars.ContextVar("rate_limit_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int):
+    """Requests made inside the block (and tasks it starts) use this priority class."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _next_utc_midnight(now: datetime) -> float:
+    return datetime.combine(now.date() + timedelta(days=1), datetime.min.time(),
+                            tzinfo=timezone.utc).timestamp()
+
+
+class RateLimiter:
+    """Token bucket for one upstream with priority-ordered waiters and a daily quota."""
+
+    def __init__(self, name: str, per_minute: int, per_day: int = 0):
+        self.name = name
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, per_minute * BURST_SHARE)
+        self.per_day = per_day
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # monotonic; 429 або вичерпане вікно
+        self.day_left: int | None = None  # з заголовків, до day_reset_at
+        self.day_used = 0  # власний лічильник, якщо заголовків нема
+        self.day_reset_at = _next_utc_midnight(datetime.now(timezone.utc))
+        self._queue: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._wakeups: list[asyncio.Future] = []
+
+    def _roll_day(self):
+        if time.time() >= self.day_reset_at:
+            self.day_left = None
+            self.day_used = 0
+            self.day_reset_at = _next_utc_midnight(datetime.now(timezone.utc))
+
+    def remaining_today(self) -> int | None:
+        self._roll_day()
+        if self.day_left is not None:
+            return self.day_left
+        return self.per_day - self.day_used if self.per_day else None
+
+    def _wait_time(self, level: int) -> float:
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        left = self.remaining_today()
+        if left is not None and self.per_day and left <= self.per_day * DAILY_RESERVE[level]:
+            # Чекаємо нової доби; перевіряємо час від часу, бо заголовок може оновитись
+            return min(self.day_reset_at - time.time(), DEFAULT_RETRY_AFTER)
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def _take(self):
+        self.tokens -= 1
+        self.day_used += 1
+        if self.day_left is not None:
+            self.day_left = max(0, self.day_left - 1)
+
+    def _notify(self):
+        for fut in self._wakeups:
+            if not fut.done() and not fut.get_loop().is_closed():
+                fut.set_result(None)
+        self._wakeups.clear()
+
+    async def _sleep(self, timeout: float | None):
+        fut = asyncio.get_running_loop().create_future()
+        self._wakeups.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def acquire(self, level: int | None = None):
+        """Waits for a token; only the highest-priority, oldest waiter may take one."""
+        level = _priority.get() if level is None else level
+        entry = (level, next(self._seq))
+        heapq.heappush(self._queue, entry)
+        started = time.perf_counter()
+        try:
+            while True:
+                wait = self._wait_time(level) if self._queue[0] == entry else None
+                if wait is not None and wait <= 0:
+                    heapq.heappop(self._queue)
+                    self._take()
+                    break
+                await self._sleep(wait)
+        except BaseException:
+            if entry in self._queue:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+            raise
+        finally:
+            self._notify()
+        rate_limit_wait.observe(time.perf_counter() - started,
+                                upstream=self.name, priority=PRIORITY_NAMES[level])
+
+    def update(self, headers, status: int | None = None):
+        """Applies rate-limit headers (and a 429 Retry-After) from an upstream response."""
+        now = time.monotonic()
+        for header, window in QUOTA_HEADERS.get(self.name, {}).items():
+            value = headers.get(header)
+            if value is None:
+                continue
+            try:
+                left = int(float(value))
+            except ValueError:
+                continue
+            quota_remaining.set(left, upstream=self.name, window=window)
+            if window == "day":
+                self._roll_day()
+                self.day_left = left
+            elif left <= 0:
+                self.blocked_until = max(self.blocked_until, now + WINDOW_SECONDS[window])
+            elif window == "minute":
+                self.tokens = min(self.tokens, left)
+        if status == 429:
+            try:
+                retry_after = float(headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+            except ValueError:
+                retry_after = DEFAULT_RETRY_AFTER
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+        left = self.remaining_today()
+        if left is not None:
+            quota_remaining.set(left, upstream=self.name, window="day")
+        self._notify()
+
+
+_limiters: dict[str, RateLimiter] = {}
+
+
+def get_limiter(upstream: str) -> RateLimiter:
+    limiter = _limiters.get(upstream)
+    if limiter is None:
+        per_minute, per_day = LIMITS[upstream]
+        limiter = _limiters[upstream] = RateLimiter(upstream, per_minute, per_day)
+    return limiter
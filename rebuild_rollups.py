@@ -0,0 +1,43 @@
+"""
+Backfills the player_daily_rollup table from matchlog.
+
+    python rebuild_rollups.py                 # from the oldest match to today
+    python rebuild_rollups.py --since 2025-04-01
+
+Table schema (Supabase / Postgres):
+
+    create table player_daily_rollup (
+        steam_id bigint not null,          -- 0 = all matches (team totals)
+        day date not null,                 -- UTC day of endtime
+        match_mode int not null,
+        games int not null,
+        wins int not null,
+        solo_games int not null,
+        total_duration int not null,
+        max_duration int not null,
+        max_duration_match_id bigint,
+        primary key (steam_id, day, match_mode)
+    );
+    create index on player_daily_rollup (day);
+"""
+import argparse
+import asyncio
+from datetime import date
+
+import db
+
+
+async def rebuild(since: date | None = None, until: date | None = None):
+    if since is None and await db.get_oldest_match_endtime() is None:
+        print("matchlog is empty, nothing to rebuild")
+        return
+    total_rows = await db.rebuild_rollups(since, until)
+    print(f"✅ Rollup rebuilt from {since or 'the oldest match'}: {total_rows} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--since", type=date.fromisoformat, default=None,
+                        help="first day to rebuild (YYYY-MM-DD), default: oldest match")
+    args = parser.parse_args()
+    asyncio.run(rebuild(args.since))
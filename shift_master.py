@@ -1,12 +1,18 @@
 import asyncio
+import os
 import random
 from datetime import datetime, timedelta, timezone
 from typing import Any, Coroutine
 
-import aiohttp
-import requests
-
+import opendota_client
 from core import get_accusative_case, names, rank_id_to_tier
+from logs import DEBUG, get_logger, sampled, span
+from match_store import match_store
+from match_table import MatchTable
+
+RANK_FETCH_CONCURRENCY = int(os.getenv("RANK_FETCH_CONCURRENCY", "5"))
+
+log = get_logger("reports")
 
 
 class Player:
@@ -22,14 +28,13 @@ class Player:
         self.channel_ids = []
 
     @staticmethod
-    def validate_steam_id(steam_id: int) -> str | None:
+    async def validate_steam_id(steam_id: int) -> str | None:
         """Validate a Steam ID using OpenDota API and return nickname if valid."""
         try:
-            response = requests.get(f"https://api.opendota.com/api/players/{steam_id}")
-            if response.status_code != 200:
+            data = await opendota_client.get_player(steam_id)
+            if not data:
                 return None
 
-            data = response.json()
             profile = data.get("profile")
             if not profile:
                 return None
@@ -38,22 +43,18 @@ class Player:
         except Exception:
             return None
 
-    def update_daily_stats(self, matches: list):
-        """Updates this player's daily stats based on recent matches."""
+    def update_daily_stats(self, index: MatchTable):
+        """
+        Updates this player's daily stats from the match table.
+        Build the table once (MatchTable.of) when updating several players.
+        """
         now = datetime.now(timezone.utc)
-        print(f"DEBUG {self.steam_id}: now={now.isoformat()}")
-        for m in matches:
-            if self.steam_id in m.player_ids:
-                delta = now - m.endtime if isinstance(m.endtime, datetime) else "BAD_TYPE"
-                if delta <= timedelta(days=7):
-                    print(f"[MATCH] {m.match_id} | ended {m.endtime} | delta={delta}")
-
-        recent_matches = [
-            m
-            for m in matches
-            if self.steam_id in m.player_ids and m.endtime and now - m.endtime <= timedelta(days=1)
-        ]
-        print(f"DEBUG {self.steam_id}: counted {len(recent_matches)} recent matches")
+        recent_matches = index.player_matches(self.steam_id, since=now - timedelta(days=1))
+        if log.isEnabledFor(DEBUG):
+            for m in index.player_matches(self.steam_id, since=now - timedelta(days=7)):
+                sampled(log, "player_match", "player %s match %s", self.steam_id, m.match_id,
+                        endtime=m.endtime, age=now - m.endtime)
+            log.debug("player %s: %d matches in the last day", self.steam_id, len(recent_matches))
 
         self.daily_games = len(recent_matches)
         self.daily_wins = sum(1 for m in recent_matches if m.win_status)
@@ -72,22 +73,6 @@ class Player:
             player_stats = f"{random.choice(names)} {self.name.get(platform)} ({rank_id_to_tier.get(self.current_rank)}) зіграв загалом {self.daily_games} {get_accusative_case(self.daily_games, game_cases)}! ({self.daily_wins} розджЕбав, {self.daily_losses} закинув), \nНа це вбив {timedelta(seconds=self.total_duration)} свого життя.\n{solo_text} WP, GN ^_^!\n"
         return player_stats
 
-    async def get_current_rank(self):
-        url = f"https://api.opendota.com/api/players/{self.steam_id}"
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        rank_tier = data.get("rank_tier", 0)
-                        return rank_tier if rank_tier is not None else 0
-                    else:
-                        print(f"❗ Failed to fetch rank for {self.steam_id}, status {resp.status}")
-                        return 0
-        except Exception as e:
-            print(f"❗ Exception while fetching rank for {self.steam_id}: {e}")
-            return 0
-
     def clear_stats(self):
         self.daily_games = 0
         self.daily_solo = 0
@@ -96,18 +81,49 @@ class Player:
         self.total_duration = 0
 
 
+async def fetch_rank(steam_id: int) -> int | None:
+    """rank_tier from OpenDota (0 if unranked), or None if the request failed."""
+    data = await opendota_client.get_player(steam_id)
+    if data is None:
+        log.warning("failed to fetch rank for %s", steam_id)
+        return None
+    return data.get("rank_tier") or 0
+
+
+async def refresh_ranks(players: list) -> dict[int, int]:
+    """
+    Ranks for all players, fetched concurrently (at most RANK_FETCH_CONCURRENCY at once).
+    Recent profiles come from the OpenDota response cache (PLAYER_TTL), not the network.
+    Players whose fetch failed are left out.
+    """
+    semaphore = asyncio.Semaphore(RANK_FETCH_CONCURRENCY)
+
+    async def fetch(steam_id):
+        async with semaphore:
+            return await fetch_rank(steam_id)
+
+    steam_ids = [player.steam_id for player in players]
+    fetched = await asyncio.gather(*(fetch(steam_id) for steam_id in steam_ids))
+    # None не вважаємо падінням рангу до 0 — це збій мережі
+    return {steam_id: rank for steam_id, rank in zip(steam_ids, fetched) if rank is not None}
+
+
 async def update_rank(platform, channel):
     msg = [""]
     import db
 
     players = await db.get_channel_players(channel)
+    ranks = await refresh_ranks(players)
+    changes = {}
 
     for player in players:
         old_rank = player.current_rank
-        new_rank = await player.get_current_rank()
+        new_rank = ranks.get(player.steam_id)
+        if new_rank is None:
+            continue
 
         if old_rank != new_rank:
-            db.update_player(player.steam_id, {"current_rank": new_rank})
+            changes[player.steam_id] = new_rank
 
             if old_rank == 0:
                 msg.append(
@@ -127,50 +143,44 @@ async def update_rank(platform, channel):
                     "НТ, скоро так в дізабіліті дріфт підеш!\n🦞🦞🦞\n"
                 )
 
-    print("\n".join(msg))
+    # Усі зміни рангів одним пакетом
+    db.update_player_ranks(changes)
+
+    log.info("rank changes: %d", len(changes))
     return msg
 
 
-async def get_last_hour_solo_losers(matches: list, players: list, platform) -> tuple[list[Any], list[Any]]:
+async def get_last_hour_solo_losers(index: MatchTable, players: list,
+                                    platform) -> tuple[list[Any], list[Any]]:
     """f() that returns list of player.name in Players, who have lost solo games within last 60 min"""
     now = datetime.now(timezone.utc)
     one_hour_ago = now - timedelta(minutes=61)
     solo_losers = []
-    for player in players:
-        for match in matches:
-            if (
-                player.steam_id in match.player_ids
-                and match.solo_status
-                and match.win_status is False
-                and match.endtime
-                and match.endtime >= one_hour_ago
-            ):
-                solo_losers.append(player.name.get(platform, player.name.get("telegram")))
-                break  # Don't double count this player, one solo loss is enough
     solo_winners = []
     for player in players:
-        for match in matches:
-            if (
-                player.steam_id in match.player_ids
-                and match.solo_status
-                and match.win_status is True
-                and match.endtime
-                and match.endtime >= one_hour_ago
-            ):
-                solo_winners.append(player.name.get(platform, player.name.get("telegram")))
-                break  # Don't double count this player, one solo loss is enough
+        recent = [m for m in index.player_matches(player.steam_id, since=one_hour_ago) if m.solo_status]
+        name = player.name.get(platform, player.name.get("telegram"))
+        # Don't double count this player, one solo loss (or win) is enough
+        if any(m.win_status is False for m in recent):
+            solo_losers.append(name)
+        if any(m.win_status is True for m in recent):
+            solo_winners.append(name)
 
     return solo_losers, solo_winners
 
 
-async def check_and_notify(channel, platform) -> str:
-    """f() returns message to messenger bot based on result from get_solo_losses()"""
+async def check_and_notify(channel, platform, matches=None) -> str:
+    """
+    f() returns message to messenger bot based on result from get_solo_losses()
+    matches — only these are checked (e.g. not yet announced ones, list or MatchTable);
+    default is the match store
+    """
     import db
 
     message = [""]
-    matches = await db.get_logged_match_objects()
+    index = await match_store.index() if matches is None else MatchTable.of(matches)
     players = await db.get_channel_players(channel)
-    solo_loss_players, solo_win_players = await get_last_hour_solo_losers(matches, players, platform)
+    solo_loss_players, solo_win_players = await get_last_hour_solo_losers(index, players, platform)
     for player in solo_loss_players:
         message.append(f"{player}, НТ, старенький, вже як є :(")
     for player in solo_win_players:
@@ -181,11 +191,11 @@ async def check_and_notify(channel, platform) -> str:
 
 
 async def collect_daily_stats(matches, players):
-    print("DEBUG DAILY STATS")
-    print(f"matches: {len(matches)}\nplayers: {len(players)}")
-    for player in players:
-        print(f"Debug player {player.steam_id}: {player.name.get('telegram')}")
-        player.update_daily_stats(matches)
+    with span(log, "collect_daily_stats", players=len(players)):
+        # Одна таблиця на всіх гравців, а не перебудова на кожного
+        index = MatchTable.of(matches)
+        for player in players:
+            player.update_daily_stats(index)
 
 
 async def generate_daily_report(platform, players):
@@ -193,7 +203,7 @@ async def generate_daily_report(platform, players):
     for player in players:
         name = player.name.get(platform)
         if not name:
-            print(f"DEBUG: {name} Player {player.steam_id} has no name for platform '{platform}'")
+            log.debug("player %s has no name for platform %r", player.steam_id, platform)
         res = await player.fetch_and_count_games(platform)
         if res is None:
             res = f"{player.name.get(platform, 'Unknown')} статистика відсутня"
@@ -218,8 +228,8 @@ async def full_stats(platform, channel) -> str:
 
     rank_msg = await update_rank(platform, channel)
     players = await db.get_channel_players(channel)
-    matches = await db.get_logged_match_objects()
-    await collect_daily_stats(matches, players)
+    index = await match_store.index()
+    await collect_daily_stats(index, players)
     msg = await generate_daily_report(platform, players)
     if len(rank_msg) > 1:
         msg += "\n⚔️⚔️⚔️ Зміни рангів ⚔️⚔️⚔️\n"
@@ -0,0 +1,94 @@
+import os
+import time
+from collections import OrderedDict
+
+import local_store
+from metrics import cache_lookup
+
+# Склад паті завершеного матчу не змінюється, тож True/False зберігаємо назавжди.
+# "Не знайдено" (STRATZ ще не обробив матч) — лише на NOT_FOUND_TTL секунд.
+NOT_FOUND_TTL = int(os.getenv("SOLO_NOT_FOUND_TTL", "3600"))
+LRU_SIZE = int(os.getenv("SOLO_CACHE_SIZE", "5000"))
+
+MISSING = object()
+
+
+class SoloCache:
+    """
+    (match_id, steam_id) -> solo status, backed by the local state DB
+    with a bounded in-memory LRU in front.
+    """
+
+    def __init__(self, max_size: int = LRU_SIZE, not_found_ttl: int = NOT_FOUND_TTL):
+        self.max_size = max_size
+        self.not_found_ttl = not_found_ttl
+        self._lru: OrderedDict[tuple[int, int], tuple[bool | None, float]] = OrderedDict()
+        self._table_ready = False
+
+    def _db(self):
+        conn = local_store.get_connection()
+        if not self._table_ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS solo_status ("
+                " match_id INTEGER NOT NULL,"
+                " steam_id INTEGER NOT NULL,"
+                " solo INTEGER,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (match_id, steam_id))"
+            )
+            self._table_ready = True
+        return conn
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    def _fresh(self, solo: bool | None, fetched_at: float, not_found_ttl: float) -> bool:
+        return solo is not None or time.time() - fetched_at < not_found_ttl
+
+    def get(self, match_id: int, steam_id: int, not_found_ttl: float | None = None):
+        """
+        Returns True/False/None from cache, or MISSING if a network lookup is needed.
+        not_found_ttl overrides how long a cached "not found" stays valid.
+        """
+        if not_found_ttl is None:
+            not_found_ttl = self.not_found_ttl
+        key = (match_id, steam_id)
+        entry = self._lru.get(key)
+        if entry is None:
+            row = self._db().execute(
+                "SELECT solo, fetched_at FROM solo_status WHERE match_id = ? AND steam_id = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                cache_lookup("solo_status", False)
+                return MISSING
+            entry = (None if row[0] is None else bool(row[0]), row[1])
+        if not self._fresh(*entry, not_found_ttl):
+            self._lru.pop(key, None)
+            cache_lookup("solo_status", False)
+            return MISSING
+        cache_lookup("solo_status", True)
+        self._remember(key, entry)
+        return entry[0]
+
+    def put_many(self, match_id: int, results: dict[int, bool | None]):
+        """Stores solo statuses for several players of one match."""
+        now = time.time()
+        rows = []
+        for steam_id, solo in results.items():
+            self._remember((match_id, steam_id), (solo, now))
+            rows.append((match_id, steam_id, None if solo is None else int(solo), now))
+        self._db().executemany(
+            "INSERT OR REPLACE INTO solo_status (match_id, steam_id, solo, fetched_at)"
+            " VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+    def put(self, match_id: int, steam_id: int, solo: bool | None):
+        self.put_many(match_id, {steam_id: solo})
+
+
+solo_cache = SoloCache()
@@ -0,0 +1,319 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from logs import get_logger
+from storage import StorageBackend
+
+SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", "shift_master.sqlite3")
+
+log = get_logger("storage")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    permissions TEXT,
+    joined_at TEXT
+);
+CREATE TABLE IF NOT EXISTS players (
+    steam_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    current_rank INTEGER DEFAULT 0,
+    channel_ids TEXT
+);
+CREATE TABLE IF NOT EXISTS player_channels (
+    steam_id INTEGER NOT NULL,
+    channel_id TEXT NOT NULL,
+    PRIMARY KEY (steam_id, channel_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS player_channels_channel_idx ON player_channels (channel_id);
+CREATE TABLE IF NOT EXISTS matchlog (
+    match_id INTEGER PRIMARY KEY,
+    player_ids TEXT,
+    win_status INTEGER,
+    solo_status INTEGER,
+    endtime TEXT,
+    duration INTEGER,
+    match_mode INTEGER
+);
+CREATE INDEX IF NOT EXISTS matchlog_endtime_idx ON matchlog (endtime);
+CREATE TABLE IF NOT EXISTS match_players (
+    match_id INTEGER NOT NULL,
+    steam_id INTEGER NOT NULL,
+    PRIMARY KEY (match_id, steam_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS match_players_steam_idx ON match_players (steam_id);
+CREATE TABLE IF NOT EXISTS player_daily_rollup (
+    steam_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    match_mode INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    solo_games INTEGER NOT NULL,
+    total_duration INTEGER NOT NULL,
+    max_duration INTEGER NOT NULL,
+    max_duration_match_id INTEGER,
+    PRIMARY KEY (steam_id, day, match_mode)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS player_daily_rollup_day_idx ON player_daily_rollup (day);
+"""
+
+# Колонки, які в Supabase мають тип json/масив, а тут зберігаються JSON-текстом
+JSON_COLUMNS = {"name", "channel_ids", "permissions", "player_ids"}
+
+
+def _utc_iso(value) -> str | None:
+    """
+    endtime зберігаємо як ISO-рядок в UTC: тоді порівняння рядків у SQLite
+    збігається з порівнянням часу.
+    """
+    if value is None:
+        return None
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def _encode(row: dict) -> dict:
+    encoded = {}
+    for column, value in row.items():
+        if column in JSON_COLUMNS and value is not None and not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False)
+        elif column == "endtime":
+            value = _utc_iso(value)
+        encoded[column] = value
+    return encoded
+
+
+def _decode(row: sqlite3.Row) -> dict:
+    decoded = dict(row)
+    for column in JSON_COLUMNS & decoded.keys():
+        if isinstance(decoded[column], str):
+            decoded[column] = json.loads(decoded[column])
+    return decoded
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Local SQLite file with the same tables as Supabase. One connection is
+    shared by all threads and guarded by a lock; WAL keeps readers unblocked.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _select(self, sql: str, params=()) -> list[dict]:
+        with self._lock:
+            return [_decode(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _write(self, sql: str, params_seq) -> bool:
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(sql, params_seq)
+            return True
+        except sqlite3.Error as e:
+            log.error("SQLite write failed: %s", e)
+            return False
+
+    def _upsert(self, table: str, rows: list[dict], conflict: tuple[str, ...]) -> bool:
+        if not rows:
+            return True
+        rows = [_encode(row) for row in rows]
+        columns = list(rows[0])
+        updates = [c for c in columns if c not in conflict]
+        on_conflict = (
+            "DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in updates)
+            if updates else "DO NOTHING"
+        )
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)})"
+            f" VALUES ({', '.join('?' * len(columns))})"
+            f" ON CONFLICT ({', '.join(conflict)}) {on_conflict}"
+        )
+        return self._write(sql, [tuple(row.get(c) for c in columns) for row in rows])
+
+    # --- channels ---
+    def get_channel_ids(self) -> list:
+        return [row["id"] for row in self._select("SELECT id FROM channels")]
+
+    def insert_channel(self, row: dict) -> bool:
+        row = _encode(row)
+        columns = list(row)
+        return self._write(
+            f"INSERT INTO channels ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(row.values())],
+        )
+
+    # --- players ---
+    def get_players(self, steam_ids: list | None = None) -> list[dict]:
+        if steam_ids is None:
+            return self._select("SELECT * FROM players")
+        return self._select(
+            "SELECT * FROM players WHERE steam_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(steam_ids)),),
+        )
+
+    def get_channel_player_ids(self, channel_id) -> list[int]:
+        rows = self._select(
+            "SELECT steam_id FROM player_channels WHERE channel_id = ?", (str(channel_id),)
+        )
+        return [row["steam_id"] for row in rows]
+
+    def get_player_channel_ids(self, steam_id: int) -> list:
+        rows = self._select(
+            "SELECT channel_id FROM player_channels WHERE steam_id = ?", (steam_id,)
+        )
+        return [row["channel_id"] for row in rows]
+
+    def insert_player(self, row: dict) -> bool:
+        encoded = _encode(row)
+        columns = list(encoded)
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    f"INSERT INTO players ({', '.join(columns)})"
+                    f" VALUES ({', '.join('?' * len(columns))})",
+                    tuple(encoded.values()),
+                )
+                # У Supabase це робить тригер на players.channel_ids
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO player_channels (steam_id, channel_id) VALUES (?, ?)",
+                    [(row["steam_id"], str(ch)) for ch in row.get("channel_ids") or []],
+                )
+            return True
+        except sqlite3.Error as e:
+            log.error("inserting player failed: %s", e)
+            return False
+
+    def upsert_players(self, rows: list[dict]) -> bool:
+        if not self._upsert("players", rows, ("steam_id",)):
+            return False
+        return self._write(
+            "INSERT OR IGNORE INTO player_channels (steam_id, channel_id) VALUES (?, ?)",
+            [(row["steam_id"], str(ch)) for row in rows for ch in row.get("channel_ids") or []],
+        )
+
+    def update_players(self, steam_ids: list, updates: dict) -> bool:
+        if not steam_ids or not updates:
+            return True
+        updates = _encode(updates)
+        assignments = ", ".join(f"{c} = ?" for c in updates)
+        return self._write(
+            f"UPDATE players SET {assignments}"
+            " WHERE steam_id IN (SELECT value FROM json_each(?))",
+            [(*updates.values(), json.dumps(list(steam_ids)))],
+        )
+
+    def unlink_player(self, steam_id: int, channel_id) -> bool:
+        return self._write(
+            "DELETE FROM player_channels WHERE steam_id = ? AND channel_id = ?",
+            [(steam_id, str(channel_id))],
+        )
+
+    def delete_player(self, steam_id: int) -> bool:
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM player_channels WHERE steam_id = ?", (steam_id,))
+                self._conn.execute("DELETE FROM players WHERE steam_id = ?", (steam_id,))
+            return True
+        except sqlite3.Error as e:
+            log.error("SQLite write failed: %s", e)
+            return False
+
+    # --- matchlog ---
+    def get_matchlog_rows(self, since: str | None = None, until: str | None = None,
+                          limit: int | None = None) -> list[dict]:
+        sql = "SELECT * FROM matchlog WHERE 1 = 1"
+        params = []
+        if since is not None:
+            sql += " AND endtime >= ?"
+            params.append(_utc_iso(since))
+        if until is not None:
+            sql += " AND endtime < ?"
+            params.append(_utc_iso(until))
+        sql += " ORDER BY endtime DESC, match_id DESC LIMIT ?"
+        params.append(-1 if limit is None else limit)
+        return self._select(sql, params)
+
+    def get_matchlog_page(self, after_match_id: int | None, limit: int) -> list[dict]:
+        return self._select(
+            "SELECT * FROM matchlog WHERE match_id > ? ORDER BY match_id LIMIT ?",
+            (-1 if after_match_id is None else after_match_id, limit),
+        )
+
+    def get_matchlog_by_ids(self, match_ids: list, columns: str = "*") -> list[dict]:
+        if not match_ids:
+            return []
+        return self._select(
+            f"SELECT {columns} FROM matchlog"
+            " WHERE match_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(match_ids)),),
+        )
+
+    def get_oldest_endtime(self) -> str | None:
+        rows = self._select("SELECT MIN(endtime) AS endtime FROM matchlog")
+        return rows[0]["endtime"] if rows else None
+
+    def upsert_matchlog(self, rows: list[dict]) -> bool:
+        return self._upsert("matchlog", rows, ("match_id",))
+
+    # --- match_players ---
+    def get_match_players(self, match_ids: list) -> list[dict]:
+        if not match_ids:
+            return []
+        return self._select(
+            "SELECT match_id, steam_id FROM match_players"
+            " WHERE match_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(match_ids)),),
+        )
+
+    def upsert_match_players(self, rows: list[dict]) -> bool:
+        return self._upsert("match_players", rows, ("match_id", "steam_id"))
+
+    def insert_match_players(self, rows: list[dict]) -> bool:
+        return self._write(
+            "INSERT INTO match_players (match_id, steam_id) VALUES (?, ?)",
+            [(row["match_id"], row["steam_id"]) for row in rows],
+        )
+
+    def delete_match_players(self, match_id: int, steam_ids: list) -> bool:
+        return self._write(
+            "DELETE FROM match_players WHERE match_id = ? AND steam_id = ?",
+            [(match_id, steam_id) for steam_id in steam_ids],
+        )
+
+    # --- player_daily_rollup ---
+    def get_rollups(self, since_day: str | None = None, until_day: str | None = None,
+                    columns: str = "*") -> list[dict]:
+        sql = f"SELECT {columns} FROM player_daily_rollup WHERE 1 = 1"
+        params = []
+        if since_day is not None:
+            sql += " AND day >= ?"
+            params.append(since_day)
+        if until_day is not None:
+            sql += " AND day <= ?"
+            params.append(until_day)
+        return self._select(sql + " ORDER BY day, steam_id, match_mode", params)
+
+    def upsert_rollups(self, rows: list[dict]) -> bool:
+        return self._upsert("player_daily_rollup", rows, ("steam_id", "day", "match_mode"))
+
+    def delete_rollup(self, steam_id: int, day: str, match_mode: int) -> bool:
+        return self._write(
+            "DELETE FROM player_daily_rollup WHERE steam_id = ? AND day = ? AND match_mode = ?",
+            [(steam_id, day, match_mode)],
+        )
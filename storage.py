@@ -0,0 +1,123 @@
+import os
+from abc import ABC, abstractmethod
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# supabase | sqlite
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+
+
+class StorageBackend(ABC):
+    """
+    Raw row access to the bot's tables (channels, players, player_channels,
+    matchlog, match_players, player_daily_rollup). Rows are plain dicts shaped
+    like Supabase returns them; caching and Match/Player building stay in db.py.
+    Methods are blocking: db.py runs bulk writes in threads via asyncio.to_thread.
+    Write methods return False when the backend reports an error.
+    """
+
+    # --- channels ---
+    @abstractmethod
+    def get_channel_ids(self) -> list: ...
+
+    @abstractmethod
+    def insert_channel(self, row: dict) -> bool: ...
+
+    # --- players ---
+    @abstractmethod
+    def get_players(self, steam_ids: list | None = None) -> list[dict]:
+        """All players, or only the given steam_ids."""
+
+    @abstractmethod
+    def get_channel_player_ids(self, channel_id) -> list[int]: ...
+
+    @abstractmethod
+    def get_player_channel_ids(self, steam_id: int) -> list: ...
+
+    @abstractmethod
+    def insert_player(self, row: dict) -> bool:
+        """Inserts a players row; row["channel_ids"] also become player_channels links."""
+
+    @abstractmethod
+    def upsert_players(self, rows: list[dict]) -> bool:
+        """Bulk insert-or-update of players rows, channel links included."""
+
+    @abstractmethod
+    def update_players(self, steam_ids: list, updates: dict) -> bool: ...
+
+    @abstractmethod
+    def unlink_player(self, steam_id: int, channel_id) -> bool: ...
+
+    @abstractmethod
+    def delete_player(self, steam_id: int) -> bool:
+        """Deletes the player together with all channel links."""
+
+    # --- matchlog ---
+    @abstractmethod
+    def get_matchlog_rows(self, since: str | None = None, until: str | None = None,
+                          limit: int | None = None) -> list[dict]:
+        """Rows with since <= endtime < until (ISO strings), newest first."""
+
+    @abstractmethod
+    def get_matchlog_page(self, after_match_id: int | None, limit: int) -> list[dict]:
+        """Up to limit rows with match_id > after_match_id, by match_id ascending."""
+
+    @abstractmethod
+    def get_matchlog_by_ids(self, match_ids: list, columns: str = "*") -> list[dict]: ...
+
+    @abstractmethod
+    def get_oldest_endtime(self) -> str | None: ...
+
+    @abstractmethod
+    def upsert_matchlog(self, rows: list[dict]) -> bool: ...
+
+    # --- match_players ---
+    @abstractmethod
+    def get_match_players(self, match_ids: list) -> list[dict]: ...
+
+    @abstractmethod
+    def upsert_match_players(self, rows: list[dict]) -> bool: ...
+
+    @abstractmethod
+    def insert_match_players(self, rows: list[dict]) -> bool: ...
+
+    @abstractmethod
+    def delete_match_players(self, match_id: int, steam_ids: list) -> bool: ...
+
+    # --- player_daily_rollup ---
+    @abstractmethod
+    def get_rollups(self, since_day: str | None = None, until_day: str | None = None,
+                    columns: str = "*") -> list[dict]:
+        """Rollup rows with since_day <= day <= until_day, oldest day first."""
+
+    @abstractmethod
+    def upsert_rollups(self, rows: list[dict]) -> bool: ...
+
+    @abstractmethod
+    def delete_rollup(self, steam_id: int, day: str, match_mode: int) -> bool: ...
+
+
+_backend: StorageBackend | None = None
+
+
+def get_backend() -> StorageBackend:
+    """Backend chosen by STORAGE_BACKEND, created on first use."""
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND == "sqlite":
+            from sqlite_storage import SQLiteStorage
+            _backend = SQLiteStorage()
+        elif STORAGE_BACKEND == "supabase":
+            from supabase_storage import SupabaseStorage
+            _backend = SupabaseStorage()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _backend
+
+
+def set_backend(backend: StorageBackend | None):
+    """Swaps the active backend (None resets to the env default on next use)."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,175 @@
+import asyncio
+import os
+
+import httpx
+from dotenv import load_dotenv
+
+from logs import get_logger
+from metrics import observe_upstream, upstream_error
+from rate_limiter import get_limiter
+
+load_dotenv()
+
+log = get_logger("stratz")
+
+GRAPHQL_URL = os.getenv("STRATZ_GRAPHQL_URL", "https://api.stratz.com/graphql")
+STRATZ_TOKEN = os.getenv("STRATZ_API_TOKEN")
+
+# Скільки матчів кладемо в один GraphQL-документ і скільки чекаємо сусідні запити
+BATCH_SIZE = int(os.getenv("STRATZ_BATCH_SIZE", "10"))
+BATCH_DELAY = 0.05
+REQUEST_TIMEOUT = httpx.Timeout(20.0)
+RETRIES = 3
+
+MATCH_FIELDS = "players { steamAccountId partyId }"
+
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+_resolver: "StratzBatchResolver | None" = None
+_resolver_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Returns the shared STRATZ client for the running event loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            headers={
+                "Authorization": f"Bearer {STRATZ_TOKEN}",
+                "Content-Type": "application/json",
+                "User-Agent": "STRATZ_API",
+            },
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_client():
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+
+def build_batch_query(match_ids: list[int]) -> str:
+    """One GraphQL document with an aliased `match(id: …)` field per match id."""
+    fields = "\n".join(f"  m{mid}: match(id: {mid}) {{ {MATCH_FIELDS} }}" for mid in match_ids)
+    return f"query {{\n{fields}\n}}"
+
+
+async def post_query(query: str) -> dict | None:
+    """Sends a GraphQL query, retrying timeouts and 429s. Returns the `data` object or None."""
+    limiter = get_limiter("stratz")
+    for attempt in range(RETRIES):
+        await limiter.acquire()
+        try:
+            with observe_upstream("stratz"):
+                response = await get_client().post(GRAPHQL_URL, json={"query": query})
+            limiter.update(response.headers, response.status_code)
+            if response.status_code == 429 and attempt < RETRIES - 1:
+                # Retry-After уже у лімітері — наступний acquire його дочекається
+                upstream_error("stratz", 429)
+                continue
+            if response.status_code != 200:
+                upstream_error("stratz", response.status_code)
+                log.warning("error %s: %s", response.status_code, response.text)
+                return None
+            # Часткові помилки (напр. один матч не знайдено) не скасовують решту data
+            return response.json().get("data") or None
+        except httpx.TimeoutException:
+            log.warning("timeout, attempt %d/%d", attempt + 1, RETRIES)
+            if attempt < RETRIES - 1:
+                await asyncio.sleep(2)
+        except httpx.HTTPError as e:
+            log.warning("request failed: %r", e)
+            return None
+    return None
+
+
+class StratzUnavailable(Exception):
+    """STRATZ request failed (HTTP error, timeout); the result is unknown, not "not found"."""
+
+
+def _retrieve_exception(fut: asyncio.Future):
+    # Усі, хто чекав на матч, могли бути скасовані (shield); тоді помилку батча ніхто
+    # не прочитає і asyncio лаятиметься "Future exception was never retrieved"
+    if not fut.cancelled():
+        fut.exception()
+
+
+class StratzBatchResolver:
+    """
+    Coalesces concurrent match lookups into batched GraphQL POSTs.
+    Each caller awaits its own future; requests arriving within BATCH_DELAY
+    (or until batch_size is reached) go out as a single document.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE, delay: float = BATCH_DELAY):
+        self.batch_size = max(1, batch_size)
+        self.delay = delay
+        self._pending: list[int] = []
+        self._futures: dict[int, asyncio.Future] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def get_match(self, match_id: int) -> dict | None:
+        fut = self._futures.get(match_id)
+        if fut is None:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            fut.add_done_callback(_retrieve_exception)
+            self._futures[match_id] = fut
+            self._pending.append(match_id)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.delay, self._flush)
+        return await asyncio.shield(fut)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, match_ids: list[int]):
+        try:
+            data = await post_query(build_batch_query(match_ids))
+        except Exception as e:
+            log.warning("batch of %d failed: %r", len(match_ids), e)
+            data = None
+        for mid in match_ids:
+            fut = self._futures.pop(mid, None)
+            if fut is None or fut.done():
+                # done() покриває й скасовані
+                continue
+            if data is None:
+                fut.set_exception(StratzUnavailable(f"match {mid}"))
+            else:
+                fut.set_result(data.get(f"m{mid}"))
+
+
+def get_resolver() -> StratzBatchResolver:
+    """Returns the process-wide resolver; futures are loop-bound, so one per event loop."""
+    global _resolver, _resolver_loop
+    loop = asyncio.get_running_loop()
+    if _resolver is None or _resolver_loop is not loop:
+        _resolver = StratzBatchResolver()
+        _resolver_loop = loop
+    return _resolver
+
+
+async def fetch_match(match_id: int) -> dict | None:
+    """
+    Returns `{"players": [{steamAccountId, partyId}, ...]}` for a match, or None if STRATZ
+    does not know it. Raises StratzUnavailable when the request itself failed.
+    """
+    return await get_resolver().get_match(match_id)
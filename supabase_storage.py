@@ -0,0 +1,235 @@
+import os
+
+from logs import get_logger
+from metrics import observe_upstream
+from storage import StorageBackend
+
+ROLLUP_TABLE = "player_daily_rollup"
+# PostgREST віддає не більше 1000 рядків за запит, тож читаємо сторінками
+PAGE_SIZE = 1000
+
+log = get_logger("storage")
+
+
+def _execute(query):
+    """Runs a PostgREST query, timing it for /metrics."""
+    with observe_upstream("supabase"):
+        return query.execute()
+
+
+class SupabaseStorage(StorageBackend):
+    """Supabase (PostgREST) tables; the client is created on first query."""
+
+    def __init__(self, url: str | None = None, key: str | None = None):
+        self.url = url or os.getenv("SUPABASE_URL")
+        self.key = key or os.getenv("SUPABASE_KEY")
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from supabase import create_client
+            self._client = create_client(self.url, self.key)
+        return self._client
+
+    def table(self, name: str):
+        return self.client.table(name)
+
+    @staticmethod
+    def _paginate(build_query, limit: int | None = None) -> list:
+        rows = []
+        start = 0
+        while limit is None or start < limit:
+            end = start + PAGE_SIZE - 1
+            if limit is not None:
+                end = min(end, limit - 1)
+            data = _execute(build_query().range(start, end)).data or []
+            rows.extend(data)
+            if len(data) < end - start + 1:
+                break
+            start = end + 1
+        return rows
+
+    # --- channels ---
+    def get_channel_ids(self) -> list:
+        response = _execute(self.table("channels").select("id"))
+        if response.data is None:
+            log.error("fetching channels returned no data")
+            return []
+        return [item["id"] for item in response.data]
+
+    def insert_channel(self, row: dict) -> bool:
+        response = _execute(self.table("channels").insert(row))
+        if response.data is None:
+            log.error("inserting channel failed: %s", response)
+            return False
+        return True
+
+    # --- players ---
+    def get_players(self, steam_ids: list | None = None) -> list[dict]:
+        query = self.table("players").select("*")
+        if steam_ids is not None:
+            if not steam_ids:
+                return []
+            query = query.in_("steam_id", steam_ids)
+        res = _execute(query)
+        if res.data is None:
+            log.warning("no data in players table")
+            return []
+        return res.data
+
+    def get_channel_player_ids(self, channel_id) -> list[int]:
+        res = _execute(
+            self.table("player_channels")
+            .select("steam_id")
+            .eq("channel_id", channel_id)
+        )
+        if res is None or res.data is None:
+            log.warning("no data in player_channels table")
+            return []
+        return [item["steam_id"] for item in res.data]
+
+    def get_player_channel_ids(self, steam_id: int) -> list:
+        res = _execute(self.table("player_channels").select("channel_id").eq("steam_id", steam_id))
+        return [item["channel_id"] for item in res.data or []]
+
+    def insert_player(self, row: dict) -> bool:
+        # player_channels заповнює тригер у Supabase з колонки channel_ids
+        res = _execute(self.table("players").insert(row))
+        if not res.data:
+            log.error("inserting player failed: %s", res)
+            return False
+        return True
+
+    def upsert_players(self, rows: list[dict]) -> bool:
+        res = _execute(self.table("players").upsert(rows, on_conflict="steam_id"))
+        if res.data is None:
+            log.error("upserting players failed: %s", res)
+            return False
+        links = [
+            {"steam_id": row["steam_id"], "channel_id": channel_id}
+            for row in rows
+            for channel_id in row.get("channel_ids") or []
+        ]
+        if links:
+            # Зв'язки могли вже створитись тригером — дублікати пропускаємо
+            res = _execute(
+                self.table("player_channels")
+                .upsert(links, on_conflict="steam_id,channel_id", ignore_duplicates=True)
+            )
+        return res.data is not None
+
+    def update_players(self, steam_ids: list, updates: dict) -> bool:
+        res = _execute(self.table("players").update(updates).in_("steam_id", list(steam_ids)))
+        return res.data is not None
+
+    def unlink_player(self, steam_id: int, channel_id) -> bool:
+        res = _execute(
+            self.table("player_channels")
+            .delete()
+            .eq("steam_id", steam_id)
+            .eq("channel_id", channel_id)
+        )
+        return res.data is not None
+
+    def delete_player(self, steam_id: int) -> bool:
+        _execute(self.table("player_channels").delete().eq("steam_id", steam_id))
+        res = _execute(self.table("players").delete().eq("steam_id", steam_id))
+        return res.data is not None
+
+    # --- matchlog ---
+    def get_matchlog_rows(self, since: str | None = None, until: str | None = None,
+                          limit: int | None = None) -> list[dict]:
+        def build_query():
+            query = self.table("matchlog").select("*")
+            if since is not None:
+                query = query.gte("endtime", since)
+            if until is not None:
+                query = query.lt("endtime", until)
+            # match_id — для стабільного порядку між сторінками
+            return query.order("endtime", desc=True).order("match_id", desc=True)
+
+        return self._paginate(build_query, limit)
+
+    def get_matchlog_page(self, after_match_id: int | None, limit: int) -> list[dict]:
+        query = self.table("matchlog").select("*")
+        if after_match_id is not None:
+            query = query.gt("match_id", after_match_id)
+        return _execute(query.order("match_id").limit(min(limit, PAGE_SIZE))).data or []
+
+    def get_matchlog_by_ids(self, match_ids: list, columns: str = "*") -> list[dict]:
+        if not match_ids:
+            return []
+        res = _execute(self.table("matchlog").select(columns).in_("match_id", list(match_ids)))
+        return res.data or []
+
+    def get_oldest_endtime(self) -> str | None:
+        res = _execute(self.table("matchlog").select("endtime").order("endtime").limit(1))
+        return res.data[0]["endtime"] if res.data else None
+
+    def upsert_matchlog(self, rows: list[dict]) -> bool:
+        res = _execute(self.table("matchlog").upsert(rows, on_conflict="match_id"))
+        if res.data is None:
+            log.error("upserting matchlog failed: %s", res)
+            return False
+        return True
+
+    # --- match_players ---
+    def get_match_players(self, match_ids: list) -> list[dict]:
+        if not match_ids:
+            return []
+        res = _execute(
+            self.table("match_players")
+            .select("match_id, steam_id")
+            .in_("match_id", list(match_ids))
+        )
+        return res.data or []
+
+    def upsert_match_players(self, rows: list[dict]) -> bool:
+        res = _execute(self.table("match_players").upsert(rows))
+        if res.data is None:
+            log.error("upserting match_players failed: %s", res)
+            return False
+        return True
+
+    def insert_match_players(self, rows: list[dict]) -> bool:
+        res = _execute(self.table("match_players").insert(rows))
+        if res.data is None:
+            log.error("inserting match_players failed: %s", res)
+            return False
+        return True
+
+    def delete_match_players(self, match_id: int, steam_ids: list) -> bool:
+        res = _execute(
+            self.table("match_players")
+            .delete()
+            .eq("match_id", match_id)
+            .in_("steam_id", list(steam_ids))
+        )
+        return res.data is not None
+
+    # --- player_daily_rollup ---
+    def get_rollups(self, since_day: str | None = None, until_day: str | None = None,
+                    columns: str = "*") -> list[dict]:
+        def build_query():
+            query = self.table(ROLLUP_TABLE).select(columns)
+            if since_day is not None:
+                query = query.gte("day", since_day)
+            if until_day is not None:
+                query = query.lte("day", until_day)
+            return query.order("day").order("steam_id").order("match_mode")
+
+        return self._paginate(build_query)
+
+    def upsert_rollups(self, rows: list[dict]) -> bool:
+        res = _execute(self.table(ROLLUP_TABLE).upsert(rows, on_conflict="steam_id,day,match_mode"))
+        return res.data is not None
+
+    def delete_rollup(self, steam_id: int, day: str, match_mode: int) -> bool:
+        res = _execute(
+            self.table(ROLLUP_TABLE).delete()
+            .eq("steam_id", steam_id)
+            .eq("day", day)
+            .eq("match_mode", match_mode)
+        )
+        return res.data is not None
@@ -1,6 +1,7 @@
-from datetime import time
+from datetime import datetime, time, timedelta, timezone
 from telegram import Update
 from telegram.ext import CommandHandler, Application, ContextTypes, CallbackContext
+from telegram.request import HTTPXRequest
 import db
 from shift_master import check_and_notify, full_stats, Player, generate_invoke_msg
 from match_stats import generate_weekly_report, generate_all_time_report
@@ -9,33 +10,69 @@ import asyncio
 from dotenv import load_dotenv
 import os
 from zoneinfo import ZoneInfo
-from match_collector_instarun_db import fetch_and_log_matches_for_last_day
+from match_collector_instarun_db import (
+    fetch_and_log_matches_for_last_day,
+    collect_for_channels,
+    collect_matches,
+    resolve_pending_solo,
+    RECONCILE_INTERVAL,
+)
 from core import get_accusative_case, day_cases
 from aiohttp import web
 import aiohttp
 from db import remove_player, add_player
 from telegram.error import Conflict
+from match_store import match_store
+from match_table import MatchTable
+from polling_scheduler import AdaptivePoller, TICK_INTERVAL
+import metrics
+from logs import get_logger
+from rate_limiter import BACKFILL, SCHEDULED, priority
+from metrics import observe_upstream, track_job, upstream_error
 
 kyiv_zone = ZoneInfo("Europe/Kyiv")
+poller = AdaptivePoller()
+announced_matches = {}  # match_id -> endtime, щоб не сповіщати двічі
+poll_lock = asyncio.Lock()
 load_dotenv()
 TG_Token = os.getenv("TELEGRAM_TOKEN")
 platform="telegram"
 loop_task = None
+log = get_logger("bot")
+DAY = 24 * 3600
+WEEK = 7 * DAY
+# Бот API телеграму — лише звичайні виклики; getUpdates (long-poll) не міряємо
+BOT_POOL_SIZE = 256
+
+
+class MeteredRequest(HTTPXRequest):
+    """Bot API transport that records latency and errors for /metrics."""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        with observe_upstream("telegram"):
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        if code >= 400:
+            upstream_error("telegram", code)
+        return code, payload
 
 async def safe_start_polling(application):
     try:
         await application.updater.start_polling()
-        print("[BOT] Polling started successfully.")
+        log.info("polling started")
     except Conflict:
-        print("[BOT] Another instance is running. Stopping this one.")
+        log.warning("another instance is running, stopping this one")
         await application.stop()
 
 async def handle(request):
     return web.Response(text="Bot is running!")
 
+async def handle_metrics(request):
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
 async def start_web_server():
     app = web.Application()
-    app.add_routes([web.get("/", handle)])
+    app.add_routes([web.get("/", handle), web.get("/metrics", handle_metrics)])
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", 8080)
@@ -73,24 +110,70 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"Щось пішло не так при додаванні каналу: {e}")
 
 async def send_stats(app, channels):
-    print('gathering stats')
-    for channel in channels:
-        await fetch_and_log_matches_for_last_day(channel, days=1)
-        text = await full_stats(platform, channel)
-        await app.bot.sendMessage(chat_id=channel, text=text)
+    with track_job("daily_stats", DAY), priority(SCHEDULED):
+        await collect_for_channels(channels, days=1)
+        for channel in channels:
+            text = await full_stats(platform, channel)
+            await app.bot.sendMessage(chat_id=channel, text=text)
 
-async def send_loss_stats(app, channels):
+async def send_weekly_stats(app, channels):
+    with track_job("weekly_report", WEEK), priority(SCHEDULED):
+        await collect_for_channels(channels, 7, incremental=False, full_roster=True)
+        for channel in channels:
+            message = await generate_weekly_report(channel, platform)
+            await app.bot.send_message(chat_id=channel, text=message)
+
+async def poll_active_players(app, channels):
+    """
+    Адаптивне опитування: збираємо матчі лише тих гравців, чия черга настала
+    (активних — часто, неактивних — все рідше), і одразу сповіщаємо про нові соло-катки.
+    """
+    if poll_lock.locked():
+        return  # попередній тік ще працює
+    async with poll_lock:
+        with track_job("poll_active_players", TICK_INTERVAL):
+            await _poll_active_players(app, channels)
+
+async def _poll_active_players(app, channels):
+    rosters = {channel: await db.get_channel_players(channel) for channel in channels}
+    players = {p.steam_id: p for roster in rosters.values() for p in roster}
+    poller.sync_roster(players.keys())
+
+    due_ids = poller.pop_due()
+    if due_ids:
+        # Лише частина ростера: player_ids доповнюються збереженими, зв'язки не видаляються
+        await collect_matches([players[steam_id] for steam_id in due_ids], days=1)
+
+    index = await match_store.index()
+    for steam_id in due_ids:
+        player_matches = index.player_matches(steam_id)
+        poller.reschedule(steam_id, player_matches[-1].endtime if player_matches else None)
+
+    # Сповіщаємо лише про матчі останньої години, про які ще не писали
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=61)
+    for match_id, endtime in list(announced_matches.items()):
+        if endtime < cutoff:
+            del announced_matches[match_id]
+    fresh = [m for m in index.window(since=cutoff) if m.match_id not in announced_matches]
+    if not fresh:
+        return
+    # Матчі без solo_status ще раз перевіряємо в STRATZ до виходу з вікна
+    if await resolve_pending_solo(fresh):
+        index = await match_store.index()
+        fresh = [m for m in index.window(since=cutoff) if m.match_id not in announced_matches]
+    fresh_table = MatchTable.of(fresh)  # одна на всі канали
     for channel in channels:
-        await fetch_and_log_matches_for_last_day(channel, days=1)
-        text = await check_and_notify(channel, platform)
+        text = await check_and_notify(channel, platform, fresh_table)
         if text:
             await app.bot.sendMessage(chat_id=channel, text=text)
+    # Невизначені не позначаємо: про соло-поразку, що визначиться пізніше, ще сповістимо
+    announced_matches.update((m.match_id, m.endtime) for m in fresh if m.solo_status is not None)
 
-async def send_weekly_stats(app, channels):
-    for channel in channels:
-        await fetch_and_log_matches_for_last_day(channel, 7)
-        message = await generate_weekly_report(channel, platform)
-        await app.bot.send_message(chat_id=channel, text=message)
+async def reconcile_job(channels):
+    # Звірка останньої доби повністю, без watermark — ловить пізні правки даних
+    with track_job("reconcile_matches", RECONCILE_INTERVAL), priority(SCHEDULED):
+        await collect_for_channels(channels, days=1, incremental=False,
+                                   full_roster=True)
 
 async def alltime(update, context):
     await update.message.reply_text("👀*розчищає підвал*...")
@@ -167,7 +250,7 @@ async def addplayer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_nick = context.args[1]
     discord_nick = context.args[2] if len(context.args) > 2 else None
 
-    nickname = Player.validate_steam_id(steam_id)
+    nickname = await Player.validate_steam_id(steam_id)
     if not nickname:
         await update.message.reply_text("❌ Не вдалося знайти гравця за цим Steam ID.")
         return
@@ -273,7 +356,11 @@ async def fetch_and_log_matches(update: Update, context: CallbackContext):
     days_before = int(context.args[0]) if context.args else 1  # Default to 1 day if no argument is passed
     channel_id = str(update.effective_chat.id)
     await update.message.reply_text(f"Гортаю звіти за {days_before} {get_accusative_case(days_before, day_cases)}")
-    await fetch_and_log_matches_for_last_day(days=days_before, channel_id=channel_id)
+    # Ручний бекфіл іде після звітів і сповіщень і не чіпає їхній запас квоти
+    with priority(BACKFILL):
+        await fetch_and_log_matches_for_last_day(
+            days=days_before, channel_id=channel_id, incremental=False
+        )
     await update.message.reply_text(f"Перевірив звіти за зміни з {days_before} {get_accusative_case(days_before, day_cases)}.")
 
 async def start_parser(update, context):
@@ -315,7 +402,12 @@ async def main():
 
     await start_web_server()
 
-    application = Application.builder().token(TG_Token).build()
+    application = (
+        Application.builder()
+        .token(TG_Token)
+        .request(MeteredRequest(connection_pool_size=BOT_POOL_SIZE))
+        .build()
+    )
     # Setup the HTTP server
 
     channels = db.get_channels()
@@ -342,7 +434,16 @@ async def main():
         time=time(hour=3, minute=0, tzinfo=kyiv_zone)
     )
     # application.job_queue.run_repeating(lambda context: asyncio.create_task(fetch_and_log_matches_for_last_day(1)), interval=79201)
-    application.job_queue.run_repeating(lambda context: asyncio.create_task(send_loss_stats(application, channels)), interval=3590)
+    # Сповіщення про соло-катки — адаптивне опитування гравців замість погодинної розсилки
+    application.job_queue.run_repeating(
+        lambda context: asyncio.create_task(poll_active_players(application, channels)),
+        interval=TICK_INTERVAL,
+    )
+    application.job_queue.run_repeating(
+        lambda context: asyncio.create_task(reconcile_job(channels)),
+        interval=RECONCILE_INTERVAL,
+        first=RECONCILE_INTERVAL,
+    )
     application.job_queue.run_daily(
         lambda context: asyncio.create_task(send_weekly_stats(application, channels)),
         time=time(hour=15, minute=0),
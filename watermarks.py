@@ -0,0 +1,46 @@
+import time
+
+import local_store
+
+_table_ready = False
+
+
+def _db():
+    global _table_ready
+    conn = local_store.get_connection()
+    if not _table_ready:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS collect_watermarks ("
+            " steam_id INTEGER PRIMARY KEY,"
+            " last_match_id INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        _table_ready = True
+    return conn
+
+
+def get_watermarks(steam_ids: list[int]) -> dict[int, int]:
+    """Returns steam_id -> newest ingested match_id for the players that have one."""
+    if not steam_ids:
+        return {}
+    placeholders = ",".join("?" * len(steam_ids))
+    rows = _db().execute(
+        "SELECT steam_id, last_match_id FROM collect_watermarks"
+        f" WHERE steam_id IN ({placeholders})",
+        list(steam_ids),
+    ).fetchall()
+    return dict(rows)
+
+
+def advance_watermarks(marks: dict[int, int]):
+    """Moves watermarks forward; never lowers an existing one."""
+    if not marks:
+        return
+    now = time.time()
+    _db().executemany(
+        "INSERT INTO collect_watermarks (steam_id, last_match_id, updated_at) VALUES (?, ?, ?)"
+        " ON CONFLICT(steam_id) DO UPDATE SET"
+        " last_match_id = MAX(last_match_id, excluded.last_match_id),"
+        " updated_at = excluded.updated_at",
+        [(steam_id, match_id, now) for steam_id, match_id in marks.items()],
+    )